@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Optional
+from Cout.estimation_cout import obtenir_grille, recharger_grille, process_wall_costs_batch
+
+class CacheCouts:
+    """Cache des coûts de murs par (hauteur, largeur, isolant, version du classeur de coûts).
+
+    Un LRU en mémoire est placé devant la table SQLite 'cache_couts' gérée par le
+    DatabaseManager. Le cache est vidé dès que la version de la feuille 'Historique'
+    ou l'empreinte du fichier Excel change.
+
+    Le cache appartient au DatabaseManager du processus : le LRU et les compteurs sont
+    protégés par un verrou (sessions Streamlit et threads de la file de jobs).
+    """
+    def __init__(self, db=None, taille_max: int = 1024):
+        self.db = db
+        self.taille_max = taille_max
+        self.version: Optional[str] = None
+        self._lru: "OrderedDict[Tuple[int, int, str], Tuple[Optional[float], Optional[float]]]" = OrderedDict()
+        self.hits_memoire = 0
+        self.hits_base = 0
+        self.misses = 0
+        self._verrou = threading.Lock()
+
+    @staticmethod
+    def _cle(hauteur_mur_cm, largeur_mur_cm, isolant) -> Tuple[int, int, str]:
+        return int(hauteur_mur_cm), int(largeur_mur_cm), str(getattr(isolant, 'value', isolant))
+
+    def _verifier_version(self):
+        """Recharge la grille si le fichier a changé et invalide le cache si la version est différente"""
+        grille = obtenir_grille()
+        if grille.est_perimee():
+            grille = recharger_grille()
+        with self._verrou:
+            nouvelle = grille.version != self.version
+            if nouvelle:
+                print(f"Cache des coûts: nouvelle version de la grille {grille.version}")
+                self._lru.clear()
+                self.version = grille.version
+        if nouvelle and self.db:
+            self.db.purger_cache_couts(grille.version)
+
+    def _memoriser(self, cle, couts):
+        with self._verrou:
+            self._lru[cle] = couts
+            self._lru.move_to_end(cle)
+            if len(self._lru) > self.taille_max:
+                self._lru.popitem(last=False)
+
+    def calculer(self, hauteur_mur_cm, largeur_mur_cm, isolant) -> Tuple[Optional[float], Optional[float]]:
+        """Retourne (coût au m², coût du mur) pour un mur, depuis le cache si possible"""
+        return self.calculer_batch([(hauteur_mur_cm, largeur_mur_cm, isolant)])[0]
+
+    def calculer_batch(self, murs: List[Tuple[int, int, str]]) -> List[Tuple[Optional[float], Optional[float]]]:
+        """Retourne les coûts d'une liste de murs (hauteur_cm, largeur_cm, isolant)"""
+        self._verifier_version()
+        version = self.version
+        cles = [self._cle(*mur) for mur in murs]
+
+        resultats: Dict[Tuple[int, int, str], Tuple[Optional[float], Optional[float]]] = {}
+        a_chercher = []
+        with self._verrou:
+            for cle in dict.fromkeys(cles):
+                couts = self._lru.get(cle)
+                if couts is not None:
+                    self._lru.move_to_end(cle)
+                    resultats[cle] = couts
+                    self.hits_memoire += 1
+                else:
+                    a_chercher.append(cle)
+
+        # Les lectures en base et les calculs se font hors du verrou
+        if a_chercher and self.db:
+            trouves = self.db.charger_cache_couts(version, a_chercher)
+            with self._verrou:
+                self.hits_base += len(trouves)
+            for cle, couts in trouves.items():
+                resultats[cle] = couts
+                self._memoriser(cle, couts)
+            a_chercher = [cle for cle in a_chercher if cle not in trouves]
+
+        if a_chercher:
+            with self._verrou:
+                self.misses += len(a_chercher)
+            nouveaux = dict(zip(a_chercher, process_wall_costs_batch([(h, l) for h, l, _ in a_chercher])))
+            for cle, couts in nouveaux.items():
+                resultats[cle] = couts
+                self._memoriser(cle, couts)
+            if self.db:
+                self.db.sauvegarder_cache_couts(version, {
+                    cle: couts for cle, couts in nouveaux.items() if couts[1] is not None
+                })
+
+        return [resultats[cle] for cle in cles]
+
+    def statistiques(self) -> Dict[str, object]:
+        """Compteurs de succès et d'échecs du cache"""
+        with self._verrou:
+            total = self.hits_memoire + self.hits_base + self.misses
+            return {
+                "version": self.version,
+                "entrees_memoire": len(self._lru),
+                "hits_memoire": self.hits_memoire,
+                "hits_base": self.hits_base,
+                "misses": self.misses,
+                "taux_succes": (self.hits_memoire + self.hits_base) / total if total else 0.0,
+            }
+
+    def vider(self):
+        """Vide le cache en mémoire et remet les compteurs à zéro"""
+        with self._verrou:
+            self._lru.clear()
+            self.hits_memoire = 0
+            self.hits_base = 0
+            self.misses = 0
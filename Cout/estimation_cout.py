@@ -1,103 +1,210 @@
 import os
-from typing import Tuple, Optional
+import hashlib
+import math
+from typing import Dict, List, Tuple, Optional
 from openpyxl import load_workbook
-import locale
-import time
 
-class ExcelInteraction:
-    def __init__(self, file_path: str = "Cout/Modele Devis v1.xlsx"):
+FICHIER_COUTS = "Cout/Modele Devis v1.xlsx"
+LARGEUR_ALVEOLE_CM = 60  # Entraxe des montants : une alvéole tous les 60 cm
+# Révision du calcul des coûts : la changer invalide les coûts déjà mis en cache
+REVISION_CALCUL = 2
+
+class GrilleCouts:
+    """Grille de prix des murs de la feuille 'Modele', chargée une seule fois en mémoire.
+
+    Les longueurs (0,6 à 9,6 m) sont en colonnes dans la ligne d'en-tête et les
+    blocs 'Hauteur de Mur' / 'TOTAL MUR' donnent le prix d'un mur pour chaque hauteur.
+    """
+    def __init__(self, file_path: str = FICHIER_COUTS):
         self.file_path = os.path.abspath(file_path)
-        self.workbook = None
-        locale.setlocale(locale.LC_NUMERIC, 'C')
+        # hauteur en cm -> {nombre d'alvéoles: coût du mur en €}
+        self.prix: Dict[int, Dict[int, float]] = {}
+        self.hauteurs: List[int] = []
+        self.version_historique = None
+        self.empreinte = ""
+        self._signature_fichier = None
+        self.charger()
+
+    @property
+    def version(self) -> str:
+        """Version de la grille : version de la feuille 'Historique', empreinte du fichier et révision du calcul"""
+        return f"v{self.version_historique}-{self.empreinte[:16]}-r{REVISION_CALCUL}"
 
-    def connect_to_excel(self) -> bool:
+    def _lire_signature_fichier(self):
+        stat = os.stat(self.file_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def est_perimee(self) -> bool:
+        """Indique si le fichier Excel a été modifié depuis le chargement de la grille"""
         try:
-            print(f"Connection à Excel pour le fichier: {self.file_path}")
-            self.workbook = load_workbook(self.file_path, data_only=True)
-            
-            print("\nNoms définis disponibles avec leurs références:")
-            for name in self.workbook.defined_names:
-                named_range = self.workbook.defined_names[name]
-                destinations = list(named_range.destinations)
-                print(f"- {name}: {destinations[0] if destinations else 'No destination'}")
-            
-            return True
-        except Exception as e:
-            print(f"Erreur lors de la connexion: {str(e)}")
-            self.cleanup()
+            return self._lire_signature_fichier() != self._signature_fichier
+        except OSError:
             return False
 
-    def set_inputs_get_outputs(self, hauteur_mur: float, largeur_mur: float) -> Tuple[Optional[float], Optional[float]]:
+    def charger(self):
+        """Lit la feuille 'Modele' et construit la grille des prix"""
+        print(f"Chargement de la grille de coûts: {self.file_path}")
+        signature = self._lire_signature_fichier()
+        with open(self.file_path, "rb") as f:
+            empreinte = hashlib.sha256(f.read()).hexdigest()
+
+        workbook = load_workbook(self.file_path, data_only=True, read_only=True)
         try:
-            # Mise à jour des inputs
-            ws_input = self.workbook['Input']
-            print(f"\nÉcriture hauteur {hauteur_mur} en B2")
-            ws_input['B2'] = float(str(hauteur_mur).replace(',', '.'))
-            
-            print(f"Écriture largeur {largeur_mur} en B3")
-            ws_input['B3'] = float(str(largeur_mur).replace(',', '.'))
-            
-            # Calculer et afficher la surface pour information
-            surface = (hauteur_mur * largeur_mur) / 10000
-            print(f"Surface calculée: {surface} m²")
-            
-            # Sauvegarder et attendre
-            print("Sauvegarde et temporisation...")
-            self.workbook.save(self.file_path)
-            time.sleep(1)  # Attendre 1 seconde
-            
-            # Recharger le fichier pour avoir les valeurs calculées
-            self.workbook = load_workbook(self.file_path, data_only=True)
-            ws_output = self.workbook['Output']
-            
-            # Lire les outputs
-            cout_m2 = ws_output['B2'].value
-            cout_mur = ws_output['B3'].value
-            
-            print(f"Valeurs calculées - Au m2: {cout_m2}, Total: {cout_mur}")
-            
-            if cout_m2 is None or cout_mur is None:
-                raise ValueError("Valeurs non trouvées")
-                
-            return round(float(cout_m2), 2), round(float(cout_mur), 2)
-            
-        except Exception as e:
-            print(f"Erreur lors du traitement: {str(e)}")
+            lignes = list(workbook['Modele'].iter_rows(values_only=True))
+            # La dernière ligne renseignée de la feuille 'Historique' donne la version du modèle
+            versions = [ligne[0] for ligne in workbook['Historique'].iter_rows(min_row=2, values_only=True)
+                        if ligne and ligne[0] is not None]
+        finally:
+            workbook.close()
+
+        # Seules les colonnes portant une longueur dans l'en-tête font partie de la grille
+        # (la colonne de calcul alimentée par la feuille 'Input' est ignorée)
+        colonnes = [i for i, valeur in enumerate(lignes[0]) if isinstance(valeur, (int, float))]
+
+        prix = {}
+        hauteurs_bloc = None
+        alveoles_bloc = None
+        for ligne in lignes[1:]:
+            libelle = str(ligne[0]).strip() if ligne and ligne[0] else ""
+            if libelle.startswith("Hauteur de Mur"):
+                hauteurs_bloc = [ligne[i] for i in colonnes]
+            elif libelle.startswith("Nombre d'alvéoles"):
+                alveoles_bloc = [ligne[i] for i in colonnes]
+            elif libelle.startswith("TOTAL MUR") and hauteurs_bloc and alveoles_bloc:
+                for hauteur, alveoles, cout in zip(hauteurs_bloc, alveoles_bloc, (ligne[i] for i in colonnes)):
+                    if hauteur is None or alveoles is None or cout is None:
+                        continue
+                    prix.setdefault(int(round(hauteur * 100)), {})[int(alveoles)] = float(cout)
+                hauteurs_bloc = None
+                alveoles_bloc = None
+
+        if not prix:
+            raise ValueError("Grille de prix introuvable dans la feuille 'Modele'")
+
+        self.prix = prix
+        self.hauteurs = sorted(prix)
+        self.version_historique = versions[-1] if versions else None
+        self.empreinte = empreinte
+        self._signature_fichier = signature
+
+    @staticmethod
+    def nombre_alveoles(largeur_mur_cm: float) -> int:
+        """Nombre d'alvéoles d'un mur, tel que calculé par le modèle Excel (0,6 m -> 1, 9,6 m -> 16)"""
+        if largeur_mur_cm <= 0:
+            raise ValueError(f"Largeur de mur invalide: {largeur_mur_cm}cm")
+        return math.ceil(largeur_mur_cm / LARGEUR_ALVEOLE_CM)
+
+    def cout_mur(self, hauteur_mur_cm: float, largeur_mur_cm: float) -> Optional[float]:
+        """Retourne le coût du mur en €, ou None si les dimensions sont hors grille"""
+        # Hauteur de grille immédiatement supérieure ou égale à la hauteur demandée
+        hauteur_grille = next((h for h in self.hauteurs if h >= hauteur_mur_cm), None)
+        if hauteur_grille is None:
+            return None
+        return self.prix[hauteur_grille].get(self.nombre_alveoles(largeur_mur_cm))
+
+    def calculer(self, hauteur_mur_cm: float, largeur_mur_cm: float) -> Tuple[Optional[float], Optional[float]]:
+        """Équivalent de Output!B2 (€/m²) et Output!B3 (€/mur) pour les dimensions données"""
+        if hauteur_mur_cm <= 0 or largeur_mur_cm <= 0:
+            return None, None
+        cout_mur = self.cout_mur(hauteur_mur_cm, largeur_mur_cm)
+        surface = (hauteur_mur_cm * largeur_mur_cm) / 10000
+        if cout_mur is None:
             return None, None
+        return round(cout_mur / surface, 2), round(cout_mur, 2)
 
-    def cleanup(self):
-        try:
-            if self.workbook:
-                self.workbook.close()
-        except Exception as e:
-            print(f"Erreur lors du nettoyage: {str(e)}")
+_grille: Optional[GrilleCouts] = None
+
+def obtenir_grille() -> GrilleCouts:
+    """Retourne la grille de coûts partagée, chargée au premier appel"""
+    global _grille
+    if _grille is None:
+        _grille = GrilleCouts()
+    return _grille
+
+def recharger_grille() -> GrilleCouts:
+    """Recharge la grille après une mise à jour des tarifs du fichier Excel"""
+    global _grille
+    _grille = GrilleCouts()
+    return _grille
+
+def _en_nombre(valeur) -> float:
+    """Convertit une dimension saisie (éventuellement avec une virgule) en nombre"""
+    return float(str(valeur).replace(',', '.'))
 
 def process_wall_costs(hauteur_mur_cm: float, largeur_mur_cm: float) -> Tuple[Optional[float], Optional[float]]:
     """
     Traite les coûts du mur avec des dimensions en centimètres.
     """
-    print(f"\nTraitement pour un mur de {hauteur_mur_cm}cm x {largeur_mur_cm}cm")
-    excel_handler = None
-
     try:
-        excel_handler = ExcelInteraction()
-        
-        if not excel_handler.connect_to_excel():
-            raise Exception("Impossible de se connecter au fichier Excel")
-            
-        # Une seule fonction pour mettre à jour et récupérer les résultats
-        cout_m2, cout_mur = excel_handler.set_inputs_get_outputs(hauteur_mur_cm, largeur_mur_cm)
-        
+        cout_m2, cout_mur = obtenir_grille().calculer(_en_nombre(hauteur_mur_cm), _en_nombre(largeur_mur_cm))
         if cout_m2 is None or cout_mur is None:
-            raise ValueError("Impossible de récupérer les coûts calculés")
-            
-        print(f"Traitement terminé avec succès : {cout_m2} EUR/m2 - {cout_mur} EUR total")
-        return float(cout_m2), float(cout_mur)
-            
+            raise ValueError(f"Dimensions hors grille de prix: {hauteur_mur_cm}cm x {largeur_mur_cm}cm")
+
+        return cout_m2, cout_mur
+
     except Exception as e:
         print(f"Erreur lors du traitement: {str(e)}")
         return None, None
-        
+
+def process_wall_costs_batch(dimensions: List[Tuple[float, float]]) -> List[Tuple[Optional[float], Optional[float]]]:
+    """
+    Traite les coûts d'une liste de murs (hauteur_cm, largeur_cm) en une seule passe sur la grille.
+    Les murs hors grille ou mal renseignés donnent (None, None).
+    """
+    grille = obtenir_grille()
+    resultats = []
+    for hauteur_mur_cm, largeur_mur_cm in dimensions:
+        try:
+            resultats.append(grille.calculer(_en_nombre(hauteur_mur_cm), _en_nombre(largeur_mur_cm)))
+        except (TypeError, ValueError):
+            resultats.append((None, None))
+    return resultats
+
+def verifier_parite(file_path: str = FICHIER_COUTS) -> bool:
+    """Compare la grille en mémoire aux valeurs calculées enregistrées dans le classeur"""
+    grille = GrilleCouts(file_path)
+    workbook = load_workbook(grille.file_path, data_only=True)
+    try:
+        ws_modele = workbook['Modele']
+        ws_output = workbook['Output']
+        ecarts = []
+
+        # Chaque colonne de la grille, tarifée à partir de ses propres dimensions d'en-tête
+        # ('Hauteur de Mur' / 'Largeur de Mur', en m), doit redonner son TOTAL MUR
+        colonnes = [cellule.column for cellule in ws_modele[1] if isinstance(cellule.value, (int, float))]
+        hauteurs = largeurs = None
+        for ligne in ws_modele.iter_rows():
+            libelle = str(ligne[0].value).strip() if ligne[0].value else ""
+            if libelle.startswith("Hauteur de Mur"):
+                hauteurs = {c: ligne[c - 1].value for c in colonnes}
+            elif libelle.startswith("Largeur de Mur"):
+                largeurs = {c: ligne[c - 1].value for c in colonnes}
+            elif libelle.startswith("TOTAL MUR") and hauteurs and largeurs:
+                for c in colonnes:
+                    if hauteurs[c] is None or largeurs[c] is None or ligne[c - 1].value is None:
+                        continue
+                    hauteur, largeur = round(hauteurs[c] * 100), round(largeurs[c] * 100)
+                    _, cout_mur = grille.calculer(hauteur, largeur)
+                    attendu = round(ligne[c - 1].value, 2)
+                    if cout_mur != attendu:
+                        ecarts.append((hauteur, largeur, cout_mur, attendu))
+                hauteurs = largeurs = None
+
+        # Output!B2/B3 correspond aux dimensions de la colonne de calcul (S35/S36, en m)
+        hauteur = round(ws_modele['S35'].value * 100)
+        largeur = round(ws_modele['S36'].value * 100)
+        attendu = (round(ws_output['B2'].value, 2), round(ws_output['B3'].value, 2))
+        obtenu = grille.calculer(hauteur, largeur)
+        if obtenu != attendu:
+            ecarts.append((hauteur, largeur, obtenu, attendu))
     finally:
-        if excel_handler:
-            excel_handler.cleanup()
\ No newline at end of file
+        workbook.close()
+
+    for ecart in ecarts:
+        print(f"Écart de parité: {ecart}")
+    print("Parité OK" if not ecarts else f"{len(ecarts)} écart(s) de parité")
+    return not ecarts
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(0 if verifier_parite() else 1)
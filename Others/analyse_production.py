@@ -0,0 +1,117 @@
+from datetime import date, timedelta
+from math import ceil
+from typing import Dict, List, Optional, Tuple
+from models import MatriceProduction
+
+SEUIL_SOUS_CHARGE = 0.8  # En dessous de 80 % de la capacité, une semaine est sous-chargée
+FENETRE_TENDANCE = 4  # Nombre de semaines de la moyenne glissante du débit
+
+class AnalysePlan:
+    """Indicateurs de charge du plan de production, calculés sur une MatriceProduction.
+
+    Toutes les listes par semaine sont alignées sur matrice.semaines ; les dictionnaires
+    par projet sont indexés par l'id du projet.
+    """
+    def __init__(self, matrice: MatriceProduction):
+        self.matrice = matrice
+        self.utilisation: List[Optional[float]] = []
+        # 'overload', 'underload', 'optimal' ou 'off' (sans capacité ni mur) : classes CSS de la page
+        self.statuts: List[str] = []
+        self.capacites: List[int] = []  # Capacité utilisable : 0 pour une semaine non travaillée
+        self.backlog: List[int] = []
+        self.moyenne_glissante: List[float] = []
+        self.tendance: float = 0.0  # Variation moyenne du nombre de murs d'une semaine à la suivante
+        self.fin_projets: Dict[int, Optional[Tuple[int, int]]] = {}
+        self.restant_projets: Dict[int, int] = {}
+
+    @property
+    def semaines_surchargees(self) -> List[Tuple[int, int]]:
+        return [(s.annee, s.numero) for s, statut in zip(self.matrice.semaines, self.statuts) if statut == 'overload']
+
+    @property
+    def utilisation_moyenne(self) -> Optional[float]:
+        """Murs prévus / capacité sur l'ensemble des semaines travaillées ayant une capacité"""
+        capacite = sum(self.capacites)
+        if not capacite:
+            return None
+        return sum(t for t, c in zip(self.matrice.totaux, self.capacites) if c) / capacite
+
+    def resume_projet(self, projet_id: int) -> Optional[Dict[str, object]]:
+        """Plan d'un projet : murs par semaine, murs restant à planifier et semaine de fin prévue"""
+        if projet_id not in self.fin_projets:
+            return None
+        valeurs = self.matrice.ligne(projet_id)
+        return {
+            "semaines": [((s.annee, s.numero), v) for s, v in zip(self.matrice.semaines, valeurs) if v],
+            "restant": self.restant_projets[projet_id],
+            "fin": self.fin_projets[projet_id],
+        }
+
+def _decaler_semaine(cle: Tuple[int, int], nb_semaines: int) -> Tuple[int, int]:
+    lundi = date.fromisocalendar(cle[0], cle[1], 1) + timedelta(weeks=nb_semaines)
+    return tuple(lundi.isocalendar()[:2])
+
+def analyser_plan(matrice: MatriceProduction, seuil_sous_charge: float = SEUIL_SOUS_CHARGE) -> AnalysePlan:
+    """
+    Calcule les indicateurs de charge d'une matrice de production, sans requête.
+
+    - utilisation : murs prévus / capacité par semaine (None si capacité nulle) ; une semaine
+      non travaillée a une capacité nulle, quelle que soit la capacité enregistrée
+    - statuts : surcharge, sous-charge, charge optimale, ou neutre ('off') pour une semaine
+      sans capacité et sans mur
+    - backlog : murs en retard cumulés (ce qui dépasse la capacité est reporté à la semaine suivante)
+    - fin_projets : semaine de fin prévue de chaque projet, d'après la dernière semaine allouée
+      y compris hors de la matrice ; les murs non alloués sont projetés après elle au débit
+      moyen du projet (None si aucun mur n'est alloué)
+    - moyenne_glissante / tendance : débit hebdomadaire lissé et sa pente
+    """
+    analyse = AnalysePlan(matrice)
+    totaux = matrice.totaux
+    capacites = [capacite if semaine.est_travaillee else 0
+                 for semaine, capacite in zip(matrice.semaines, matrice.capacites)]
+    analyse.capacites = capacites
+
+    analyse.utilisation = [total / capacite if capacite else None for total, capacite in zip(totaux, capacites)]
+    analyse.statuts = [
+        'overload' if total > capacite
+        else 'off' if not capacite
+        else 'underload' if total < seuil_sous_charge * capacite
+        else 'optimal'
+        for total, capacite in zip(totaux, capacites)
+    ]
+
+    retard = 0
+    for total, capacite in zip(totaux, capacites):
+        retard = max(retard + total - capacite, 0)
+        analyse.backlog.append(retard)
+
+    # Sommes cumulées : moyenne glissante en une passe
+    cumul = [0]
+    for total in totaux:
+        cumul.append(cumul[-1] + total)
+    analyse.moyenne_glissante = [
+        (cumul[j + 1] - cumul[max(j + 1 - FENETRE_TENDANCE, 0)]) / min(j + 1, FENETRE_TENDANCE)
+        for j in range(len(totaux))
+    ]
+
+    # Pente des moindres carrés du débit hebdomadaire
+    n = len(totaux)
+    if n > 1:
+        moyenne_x = (n - 1) / 2
+        moyenne_y = cumul[-1] / n
+        variance = sum((j - moyenne_x) ** 2 for j in range(n))
+        analyse.tendance = sum((j - moyenne_x) * (total - moyenne_y) for j, total in enumerate(totaux)) / variance
+
+    for k, projet_id in enumerate(matrice.projet_ids):
+        non_allouees = matrice.non_allouees[k]
+        analyse.restant_projets[projet_id] = non_allouees
+        fin = matrice.dernieres_semaines[k]
+        if fin is None or not matrice.nb_semaines_allouees[k]:
+            analyse.fin_projets[projet_id] = None
+            continue
+        if non_allouees:
+            debit = (sum(matrice.valeurs[k]) + matrice.hors_horizon[k]) / matrice.nb_semaines_allouees[k]
+            fin = _decaler_semaine(fin, ceil(non_allouees / debit))
+        analyse.fin_projets[projet_id] = fin
+
+    return analyse
@@ -0,0 +1,138 @@
+import argparse
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, Optional
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, PageBreak
+from models import StatutProjet, PlanificationProduction
+from Others.analyse_production import analyser_plan
+from Others.generer_pdf_projet import generer_pdf_projet_fichier, chemin_cache_pdf, construire_story, nettoyer_cache
+
+STATUTS_EXPORT = (StatutProjet.EN_FABRICATION, StatutProjet.EN_INSTALLATION)
+
+# Analyse du plan transmise une seule fois à chaque processus de travail
+_analyse_processus = None
+
+def _initialiser_processus(analyse):
+    global _analyse_processus
+    _analyse_processus = analyse
+
+def _generer_dans_processus(projet) -> str:
+    return generer_pdf_projet_fichier(projet, _analyse_processus, nettoyer=False)
+
+def _nom_fichier(projet) -> str:
+    nom = "".join(c if c.isalnum() or c in "-_" else "_" for c in projet.nom)
+    return f"{projet.id:04d}_{nom}.pdf"
+
+def selectionner_projets(projets, statuts=STATUTS_EXPORT):
+    return sorted((p for p in projets if p.statut in statuts), key=lambda p: p.id)
+
+def exporter_pdfs_projets(projets, analyse=None, destination: Optional[str] = None, format: str = "zip",
+                          nb_processus: Optional[int] = None,
+                          progression: Optional[Callable[[int, int, object], None]] = None) -> str:
+    """
+    Exporte les PDF d'une liste de projets dans une archive ZIP ou un seul PDF.
+
+    - zip : les PDF absents du cache sont générés en parallèle dans des processus séparés ;
+      le cache n'est réduit qu'une fois l'archive écrite
+    - pdf : un seul document avec un projet par section (reportlab ne sait pas fusionner
+      des PDF existants, le document est donc construit dans le processus courant)
+
+    progression(fait, total, projet) est appelée après chaque projet.
+    Retourne le chemin du fichier produit.
+    """
+    if format not in ("zip", "pdf"):
+        raise ValueError(f"Format d'export inconnu: {format}")
+    if destination is None:
+        fd, destination = tempfile.mkstemp(suffix=f".{format}", prefix="projets_")
+        os.close(fd)
+    total = len(projets)
+
+    if format == "pdf":
+        story = []
+        for i, projet in enumerate(projets, 1):
+            if story:
+                story.append(PageBreak())
+            story.extend(construire_story(projet, analyse))
+            if progression:
+                progression(i, total, projet)
+        SimpleDocTemplate(destination, pagesize=A4).build(story)
+        return destination
+
+    # Les projets dont le PDF est déjà en cache ne sont pas envoyés aux processus
+    chemins = {}
+    a_generer = []
+    fait = 0
+    for projet in projets:
+        chemin = chemin_cache_pdf(projet, analyse)
+        if os.path.exists(chemin):
+            chemins[projet.id] = chemin
+            fait += 1
+            if progression:
+                progression(fait, total, projet)
+        else:
+            a_generer.append(projet)
+
+    if len(a_generer) > 1 and nb_processus != 1:
+        with ProcessPoolExecutor(max_workers=nb_processus, initializer=_initialiser_processus,
+                                 initargs=(analyse,)) as executor:
+            futures = {executor.submit(_generer_dans_processus, projet): projet for projet in a_generer}
+            for future in as_completed(futures):
+                projet = futures[future]
+                chemins[projet.id] = future.result()
+                fait += 1
+                if progression:
+                    progression(fait, total, projet)
+    else:
+        for projet in a_generer:
+            chemins[projet.id] = generer_pdf_projet_fichier(projet, analyse, nettoyer=False)
+            fait += 1
+            if progression:
+                progression(fait, total, projet)
+
+    # Les PDF sont déjà compressés : ils sont stockés tels quels dans l'archive
+    with zipfile.ZipFile(destination, "w", compression=zipfile.ZIP_STORED) as archive:
+        for projet in projets:
+            try:
+                archive.write(chemins[projet.id], _nom_fichier(projet))
+            except FileNotFoundError:
+                # Retiré du cache par une génération concurrente (PDF d'un projet seul) : régénéré
+                archive.write(generer_pdf_projet_fichier(projet, analyse, nettoyer=False), _nom_fichier(projet))
+    nettoyer_cache()
+    return destination
+
+def exporter_portefeuille(db, destination: Optional[str] = None, format: str = "zip",
+                          statuts=STATUTS_EXPORT, nb_processus: Optional[int] = None,
+                          progression=None) -> str:
+    """Exporte les PDF de tous les projets aux statuts donnés (en fabrication et en installation par défaut)"""
+    projets = selectionner_projets(db.charger_tous_projets(), statuts)
+    analyse = analyser_plan(PlanificationProduction(db).matrice_production(maxSemaines=26))
+    return exporter_pdfs_projets(projets, analyse, destination, format, nb_processus, progression)
+
+def main(arguments: Optional[List[str]] = None):
+    """Export des PDF du portefeuille en ligne de commande"""
+    from bdd.database import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Exporte les PDF des projets en fabrication et en installation")
+    parser.add_argument("sortie", help="Fichier produit (.zip ou .pdf)")
+    parser.add_argument("--db", default="bdd/construction_projects.db", help="Base de données")
+    parser.add_argument("--format", choices=("zip", "pdf"), help="Format (par défaut, l'extension de la sortie)")
+    parser.add_argument("--processus", type=int, default=None, help="Nombre de processus de génération")
+    args = parser.parse_args(arguments)
+
+    format = args.format or ("pdf" if args.sortie.lower().endswith(".pdf") else "zip")
+    db = DatabaseManager(args.db)
+    debut = time.perf_counter()
+    def afficher(fait, total, projet):
+        print(f"[{fait}/{total}] {projet.nom}")
+    try:
+        chemin = exporter_portefeuille(db, args.sortie, format, nb_processus=args.processus, progression=afficher)
+    finally:
+        db.fermer()
+    print(f"Export terminé: {chemin} ({time.perf_counter() - debut:.1f} s)")
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,115 @@
+import hashlib
+import os
+import tempfile
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.units import inch
-from io import BytesIO
-import streamlit as st
 from models import StatutProjet
 
-def generer_pdf_projet(projet):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
+DOSSIER_CACHE_PDF = os.path.join(tempfile.gettempdir(), "ob2_pdf")
+TAILLE_CACHE_PDF = 200  # Nombre de PDF gardés sur disque
+SEUIL_TABLEAU_INSTANCES = 50  # Au-delà, les instances sont listées dans un tableau compact
+
+# Styles construits une seule fois pour tout le processus
+styles = getSampleStyleSheet()
+title_style = ParagraphStyle(
+    'CustomTitle',
+    parent=styles['Heading1'],
+    fontSize=24,
+    spaceAfter=30
+)
+style_tableau = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+])
+
+def empreinte_projet(projet, analyse=None) -> str:
+    """Empreinte du contenu imprimé d'un projet : deux projets de même empreinte donnent le même PDF"""
+    h = hashlib.sha256()
+    def ajouter(*valeurs):
+        h.update(repr(valeurs).encode('utf-8'))
+    ajouter(projet.id, projet.nom, projet.statut.value, projet.date_creation.isoformat(), projet.adresse,
+            projet.cout_total)
+    for doc in projet.documents:
+        ajouter('document', doc.nom, doc.type.value)
+    for modele in projet.modeles_mur:
+        ajouter('modele', modele.reference, modele.longueur, modele.hauteur, modele.epaisseur,
+                modele.cout, modele.statut.value, len(modele.instances))
+        for ouv in modele.ouvertures:
+            ajouter('ouverture', ouv.type, ouv.largeur, ouv.hauteur, ouv.position_x, ouv.position_y)
+    for instance in projet.instances_mur:
+        ajouter('instance', instance.numero, instance.statut.value, instance.modele.reference,
+                instance.modele.statut.value, instance.modele.longueur, instance.modele.hauteur,
+                instance.modele.epaisseur, [(doc.nom, doc.type.value) for doc in instance.documents])
+    ajouter('production', analyse.resume_projet(projet.id) if analyse else None)
+    return h.hexdigest()
+
+def chemin_cache_pdf(projet, analyse=None) -> str:
+    """Chemin du PDF d'un projet dans le cache (le fichier n'existe pas forcément)"""
+    return os.path.join(DOSSIER_CACHE_PDF, f"projet_{projet.id}_{empreinte_projet(projet, analyse)[:32]}.pdf")
+
+def _date_modification(chemin) -> float:
+    # Le fichier a pu être supprimé entre-temps par une autre génération
+    try:
+        return os.path.getmtime(chemin)
+    except FileNotFoundError:
+        return 0
+
+def nettoyer_cache():
+    """Supprime les PDF les plus anciens au-delà de TAILLE_CACHE_PDF"""
+    try:
+        noms = os.listdir(DOSSIER_CACHE_PDF)
+    except FileNotFoundError:
+        return
+    fichiers = [os.path.join(DOSSIER_CACHE_PDF, nom) for nom in noms if nom.endswith('.pdf')]
+    if len(fichiers) <= TAILLE_CACHE_PDF:
+        return
+    for chemin in sorted(fichiers, key=_date_modification)[:len(fichiers) - TAILLE_CACHE_PDF]:
+        try:
+            os.remove(chemin)
+        except OSError:
+            pass  # Déjà supprimé par une autre génération
+
+def generer_pdf_projet_fichier(projet, analyse=None, nettoyer: bool = True) -> str:
+    """
+    Retourne le chemin du PDF d'un projet, généré seulement si son contenu a changé.
+
+    Le PDF est écrit directement dans un fichier temporaire (pas de copie en mémoire)
+    puis renommé dans le cache, indexé par l'empreinte du projet.
+    Avec nettoyer=False, le cache n'est pas réduit (export par lots : il l'est une fois
+    l'archive écrite).
+    """
+    os.makedirs(DOSSIER_CACHE_PDF, exist_ok=True)
+    chemin = chemin_cache_pdf(projet, analyse)
+    if os.path.exists(chemin):
+        os.utime(chemin)  # Le plus récemment utilisé est gardé le plus longtemps
+        return chemin
+
+    fd, chemin_temporaire = tempfile.mkstemp(suffix='.pdf', dir=DOSSIER_CACHE_PDF)
+    os.close(fd)
+    try:
+        doc = SimpleDocTemplate(chemin_temporaire, pagesize=A4)
+        doc.build(construire_story(projet, analyse))
+        os.replace(chemin_temporaire, chemin)
+    except Exception:
+        os.remove(chemin_temporaire)
+        raise
+    if nettoyer:
+        nettoyer_cache()
+    return chemin
+
+def generer_pdf_projet(projet, analyse=None):
+    """Génère le PDF d'un projet ; avec une AnalysePlan, ajoute la planification de production"""
+    with open(generer_pdf_projet_fichier(projet, analyse), 'rb') as f:
+        return f.read()
+
+def construire_story(projet, analyse=None):
     story = []
-    styles = getSampleStyleSheet()
     
     # Titre
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30
-    )
     story.append(Paragraph(f"Projet: {projet.nom}", title_style))
     
     # Informations générales
@@ -40,8 +130,7 @@ def generer_pdf_projet(projet):
     
     # Coût
     story.append(Paragraph("Coût", styles['Heading2']))
-    cout_total = sum(round(modele.cout * len(modele.instances), 2) for modele in projet.modeles_mur) if projet.modeles_mur else 0
-    story.append(Paragraph(f"Coût total estimé: {cout_total}€", styles['Normal']))
+    story.append(Paragraph(f"Coût total estimé: {projet.cout_total}€", styles['Normal']))
     
     if projet.modeles_mur:
         story.append(Paragraph("Détail des coûts:", styles['Normal']))
@@ -53,6 +142,24 @@ def generer_pdf_projet(projet):
             ))
     story.append(Spacer(1, 20))
     
+    # Planification de la production
+    resume = analyse.resume_projet(projet.id) if analyse else None
+    if resume:
+        story.append(Paragraph("Planification de la production", styles['Heading2']))
+        if resume["semaines"]:
+            table = Table(
+                [["Semaine", "Murs"]] + [[f"S{numero} {annee}", nb] for (annee, numero), nb in resume["semaines"]]
+            )
+            table.setStyle(style_tableau)
+            story.append(table)
+        story.append(Paragraph(f"Murs restant à planifier: {resume['restant']}", styles['Normal']))
+        fin = resume["fin"]
+        story.append(Paragraph(
+            f"Fin de fabrication prévue: {f'semaine {fin[1]} de {fin[0]}' if fin else 'non planifiée'}",
+            styles['Normal']
+        ))
+        story.append(Spacer(1, 20))
+    
     # Murs
     story.append(Paragraph("Murs", styles['Heading2']))
     if projet.statut == StatutProjet.EN_CONCEPTION:
@@ -77,7 +184,22 @@ def generer_pdf_projet(projet):
     else:
         instances_filtrees = [inst for inst in projet.instances_mur 
                             if inst.modele.statut != StatutProjet.EN_CONCEPTION]
-        if instances_filtrees:
+        if len(instances_filtrees) > SEUIL_TABLEAU_INSTANCES:
+            # Une ligne par instance : le tableau est découpé sur plusieurs pages
+            lignes = [["N°", "Modèle", "Statut", "Dimensions (cm)", "Documents"]] + [
+                [
+                    instance.numero,
+                    instance.modele.reference,
+                    instance.statut.value,
+                    f"{instance.modele.longueur}×{instance.modele.hauteur}×{instance.modele.epaisseur}",
+                    Paragraph(", ".join(doc.nom for doc in instance.documents), styles['Normal']) if instance.documents else "",
+                ]
+                for instance in sorted(instances_filtrees, key=lambda x: x.numero)
+            ]
+            table = Table(lignes, repeatRows=1, colWidths=[0.5 * inch, 1.3 * inch, 1 * inch, 1.4 * inch, 2.3 * inch])
+            table.setStyle(style_tableau)
+            story.append(table)
+        elif instances_filtrees:
             for instance in sorted(instances_filtrees, key=lambda x: x.numero):
                 story.append(Paragraph(
                     f"Instance n°{instance.numero} - {instance.modele.reference}",
@@ -95,7 +217,4 @@ def generer_pdf_projet(projet):
                         story.append(Paragraph(f"• {doc.nom} ({doc.type.value})", styles['Normal']))
                 story.append(Spacer(1, 10))
     
-    doc.build(story)
-    pdf = buffer.getvalue()
-    buffer.close()
-    return pdf
\ No newline at end of file
+    return story
\ No newline at end of file
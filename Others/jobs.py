@@ -0,0 +1,128 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Hashable, Optional
+from Cout.estimation_cout import recharger_grille
+from models import Job, StatutProjet, PlanificationProduction
+from Others.analyse_production import analyser_plan
+from Others.generer_pdf_projet import generer_pdf_projet_fichier
+
+# Type de job -> fonction(db, **parametres) retournant un résultat sérialisable en JSON
+TACHES: Dict[str, Callable] = {}
+# Type de job -> fonction(parametres) retournant la clé de série du job
+SERIES: Dict[str, Callable[[Dict[str, object]], Hashable]] = {}
+
+def tache(type_job: str, serie: Optional[Callable[[Dict[str, object]], Hashable]] = None):
+    """Enregistre une fonction comme tâche de fond exécutable par FileJobs
+
+    Les jobs de même clé de série (ex. le même modèle de mur) sont exécutés un par un,
+    dans l'ordre de soumission.
+    """
+    def enregistrer(fonction):
+        TACHES[type_job] = fonction
+        if serie is not None:
+            SERIES[type_job] = serie
+        return fonction
+    return enregistrer
+
+class FileJobs:
+    """File de tâches de fond exécutées dans un pool de threads du processus Streamlit.
+
+    Les jobs sont enregistrés dans la table 'jobs' : une page soumet un job, puis lit
+    son statut et son résultat aux reruns suivants sans être bloquée. Les jobs
+    interrompus par un arrêt de l'application sont repris au démarrage, et un job en
+    échec peut être relancé.
+    """
+    def __init__(self, db, nb_threads: int = 2):
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=nb_threads, thread_name_prefix="job")
+        self._verrou = threading.Lock()
+        self._series: Dict[Hashable, Deque[int]] = {}  # Clé de série -> jobs en attente derrière celui en cours
+        for job_id in db.reprendre_jobs_interrompus():
+            self._planifier(db.charger_job(job_id))
+
+    def soumettre(self, type_job: str, **parametres) -> int:
+        """Enregistre un job et le met dans la file ; retourne son id"""
+        if type_job not in TACHES:
+            raise ValueError(f"Type de job inconnu: {type_job}")
+        job = self.db.creer_job(Job(type_job, parametres))
+        self._planifier(job)
+        return job.id
+
+    def job(self, job_id: int) -> Optional[Job]:
+        return self.db.charger_job(job_id)
+
+    def relancer(self, job_id: int) -> bool:
+        """Relance un job en échec ; False s'il n'était pas en échec"""
+        if not self.db.relancer_job(job_id):
+            return False
+        self._planifier(self.db.charger_job(job_id))
+        return True
+
+    def arreter(self, attendre: bool = True):
+        self._executor.shutdown(wait=attendre)
+
+    def _planifier(self, job: Job):
+        serie = SERIES.get(job.type)
+        if serie is None:
+            self._executor.submit(self._executer, job.id)
+            return
+        cle = serie(job.parametres)
+        with self._verrou:
+            if cle in self._series:
+                self._series[cle].append(job.id)
+                return
+            self._series[cle] = deque()
+        self._executor.submit(self._executer_serie, cle, job.id)
+
+    def _executer_serie(self, cle: Hashable, job_id: Optional[int]):
+        """Exécute un job puis ceux soumis entre-temps avec la même clé de série"""
+        while job_id is not None:
+            try:
+                self._executer(job_id)
+            except Exception:
+                pass  # Job resté 'En cours' en base : il sera repris au prochain démarrage
+            with self._verrou:
+                file = self._series[cle]
+                job_id = file.popleft() if file else None
+                if job_id is None:
+                    del self._series[cle]
+
+    def _executer(self, job_id: int):
+        # Le job a pu être pris entre-temps (relance en double, autre processus)
+        if not self.db.demarrer_job(job_id):
+            return
+        job = self.db.charger_job(job_id)
+        try:
+            resultat = TACHES[job.type](self.db, **job.parametres)
+        except Exception as e:
+            self.db.echouer_job(job_id, e)
+        else:
+            self.db.terminer_job(job_id, resultat)
+
+@tache("pdf_projet")
+def tache_pdf_projet(db, projet_id):
+    """Génère le PDF d'un projet (avec sa planification s'il est en fabrication)"""
+    projet = db.charger_projet(projet_id)
+    if projet is None:
+        raise ValueError(f"Projet {projet_id} introuvable")
+    analyse = None
+    if projet.statut == StatutProjet.EN_FABRICATION:
+        analyse = analyser_plan(PlanificationProduction(db).matrice_production(maxSemaines=26))
+    return {"chemin": generer_pdf_projet_fichier(projet, analyse)}
+
+@tache("nombre_instances", serie=lambda parametres: ("modele", parametres["modele_id"]))
+def tache_nombre_instances(db, projet_id, modele_id, nb_instances):
+    """Crée ou supprime des instances pour qu'un modèle de mur en ait nb_instances"""
+    projet = db.charger_projet(projet_id)
+    modele = next((m for m in projet.modeles_mur if m.id == modele_id), None) if projet else None
+    if modele is None:
+        raise ValueError(f"Modèle de mur {modele_id} introuvable dans le projet {projet_id}")
+    crees, supprimees = db.ajuster_nombre_instances_mur(modele, projet_id, nb_instances)
+    return {"crees": len(crees), "supprimees": supprimees}
+
+@tache("recalcul_couts")
+def tache_recalcul_couts(db, projet_id=None):
+    """Recharge la grille de coûts puis recalcule le coût des modèles de mur (tous, ou ceux d'un projet)"""
+    recharger_grille()
+    return {"nb_modeles": db.recalculer_couts_modeles_mur(projet_id)}
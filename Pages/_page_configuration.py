@@ -1,5 +1,7 @@
+import os
 import streamlit as st
-from models import TypeIsolant
+from models import TypeIsolant, StatutJob
+from Others.export_pdf import exporter_portefeuille
 
 def Page_configuration():
     st.title("Configuration")
@@ -22,3 +24,47 @@ def Page_configuration():
         st.write("Types d'isolant disponibles:")
         for isolant in TypeIsolant:
             st.write(f"- {isolant.value}")
+
+    with st.expander("Tarifs des murs"):
+        st.write("Après une mise à jour du fichier 'Modele Devis v1.xlsx', recalculer le coût de tous les modèles de mur.")
+        if st.button("Recalculer les coûts des modèles"):
+            st.session_state.job_couts = st.session_state.jobs.soumettre("recalcul_couts")
+        if 'job_couts' in st.session_state:
+            job = st.session_state.jobs.job(st.session_state.job_couts)
+            if job.statut == StatutJob.TERMINE:
+                st.success(f"{job.resultat['nb_modeles']} modèle(s) de mur recalculé(s)")
+            elif job.statut == StatutJob.ECHEC:
+                st.error(f"Erreur lors du recalcul des coûts : {job.erreur}")
+                if st.button("Réessayer", key="relancer_couts"):
+                    st.session_state.jobs.relancer(job.id)
+                    st.rerun()
+            else:
+                st.info("Recalcul des coûts en cours...")
+                if st.button("Actualiser", key="actualiser_couts"):
+                    st.rerun()
+
+        stats = st.session_state.db.cache_couts.statistiques()
+        st.write(f"**Cache des coûts** (version {stats['version'] or 'non chargée'}) : "
+                 f"{stats['hits_memoire']} succès mémoire, {stats['hits_base']} succès base, "
+                 f"{stats['misses']} calculs, taux de succès {stats['taux_succes']:.0%}")
+
+    # Section Export
+    st.header("Export")
+    with st.expander("PDF des projets en fabrication et en installation"):
+        format_export = st.radio("Format", ["zip", "pdf"], horizontal=True,
+                                 format_func=lambda f: "Archive ZIP (un PDF par projet)" if f == "zip" else "PDF unique")
+        if st.button("Exporter les PDF"):
+            barre = st.progress(0.0, text="Export des PDF...")
+            def afficher(fait, total, projet):
+                barre.progress(fait / total, text=f"{fait}/{total} - {projet.nom}")
+            try:
+                chemin = exporter_portefeuille(st.session_state.db, format=format_export, progression=afficher)
+                with open(chemin, "rb") as f:
+                    st.session_state.export_pdf = (f.read(), format_export)
+                os.remove(chemin)
+            except Exception as e:
+                st.error(f"Erreur lors de l'export : {str(e)}")
+        if 'export_pdf' in st.session_state:
+            contenu, format_fichier = st.session_state.export_pdf
+            st.download_button("Télécharger l'export", contenu, file_name=f"projets.{format_fichier}",
+                               mime="application/zip" if format_fichier == "zip" else "application/pdf")
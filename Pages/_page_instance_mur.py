@@ -4,7 +4,7 @@ from Others.documents import sauvegarder_document
 
 def Page_instance_mur_afficher():
     if not hasattr(st.session_state, 'projets'):
-        st.session_state.projets = st.session_state.db.charger_tous_projets()
+        st.session_state.projets = st.session_state.depot.projets()
     
     st.header("Gestion des Instances de Mur")
     
@@ -43,21 +43,23 @@ def Page_instance_mur_afficher():
             
             if submitted:
                 try:
-                    for i in range(nb_instances):
-                        instance = InstanceMur(prochain_numero + i, modele)
-                        instance.sauvegarder(st.session_state.db, projet.id, modele.id)
-                        
-                        if documents:
-                            for doc, type_doc in zip(documents, types_docs):
-                                document = sauvegarder_document(doc, type_doc)
-                                document.sauvegarder(st.session_state.db, instance_id=instance.id)
-                                instance.documents.append(document)
-                        
-                        modele.instances.append(instance)
-                        projet.instances_mur.append(instance)
+                    # Instances et documents enregistrés en une seule transaction à la sortie du bloc
+                    with st.session_state.session as session:
+                        for i in range(nb_instances):
+                            instance = InstanceMur(prochain_numero + i, modele)
+                            instance.sauvegarder(session, projet.id, modele.id)
+                            
+                            if documents:
+                                for doc, type_doc in zip(documents, types_docs):
+                                    document = sauvegarder_document(doc, type_doc)
+                                    document.sauvegarder(session, instance_id=instance)
+                                    instance.documents.append(document)
+                            
+                            modele.instances.append(instance)
+                            projet.instances_mur.append(instance)
                     
                     st.session_state.afficher_form_instance = False
-                    st.session_state.projets = st.session_state.db.charger_tous_projets()
+                    st.session_state.projets = st.session_state.depot.projets()
                     st.success(f"{nb_instances} instance(s) de mur créée(s) avec succès!")
                     st.rerun()
                 except Exception as e:
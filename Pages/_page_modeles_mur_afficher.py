@@ -4,7 +4,7 @@ from Others.documents import sauvegarder_document
 
 def Page_modeles_mur_afficher():
     if not hasattr(st.session_state, 'projets'):
-        st.session_state.projets = st.session_state.db.charger_tous_projets()
+        st.session_state.projets = st.session_state.depot.projets()
     
     st.header("Gestion des Modèles de Mur")
     
@@ -91,27 +91,29 @@ def Page_modeles_mur_afficher():
             
             if submitted:
                 try:
-                    if not modele:
-                        modele = ModeleMur(reference, longueur, hauteur, epaisseur, isolant)
-                        modele.ouvertures = ouvertures
-                        modele.sauvegarder(st.session_state.db, projet.id)
-                    else:
-                        modele.reference = reference
-                        modele.longueur = longueur
-                        modele.hauteur = hauteur
-                        modele.epaisseur = epaisseur
-                        modele.isolant = isolant
-                        modele.ouvertures = ouvertures
-                        modele.modifier(st.session_state.db)
-                    
-                    # Ajout des nouveaux documents
-                    if nouveaux_docs:
-                        for doc, type_doc in zip(nouveaux_docs, types_docs):
-                            document = sauvegarder_document(doc, type_doc)
-                            document.sauvegarder(st.session_state.db, modele_id=modele.id)
+                    # Modèle et documents enregistrés en une seule transaction à la sortie du bloc
+                    with st.session_state.session as session:
+                        if not modele:
+                            modele = ModeleMur(reference, longueur, hauteur, epaisseur, isolant)
+                            modele.ouvertures = ouvertures
+                            modele.sauvegarder(session, projet.id)
+                        else:
+                            modele.reference = reference
+                            modele.longueur = longueur
+                            modele.hauteur = hauteur
+                            modele.epaisseur = epaisseur
+                            modele.isolant = isolant
+                            modele.ouvertures = ouvertures
+                            modele.modifier(session)
+                        
+                        # Ajout des nouveaux documents
+                        if nouveaux_docs:
+                            for doc, type_doc in zip(nouveaux_docs, types_docs):
+                                document = sauvegarder_document(doc, type_doc)
+                                document.sauvegarder(session, modele_id=modele)
                     
                     # Mise à jour de l'interface
-                    st.session_state.projets = st.session_state.db.charger_tous_projets()
+                    st.session_state.projets = st.session_state.depot.projets()
                     if is_modification:
                         del st.session_state.modele_a_modifier
                     else:
@@ -153,6 +155,6 @@ def Page_modeles_mur_afficher():
                     with col2:
                         if st.button("Supprimer", key=f"del_model_{projet.nom}_{modele.id}"):
                             modele.supprimer(st.session_state.db)
-                            st.session_state.projets = st.session_state.db.charger_tous_projets()
+                            st.session_state.projets = st.session_state.depot.projets()
                             st.success("Modèle supprimé avec succès!")
                             st.rerun()
\ No newline at end of file
@@ -1,11 +1,10 @@
 import streamlit as st
 import streamlit.components.v1 as stc
-from models import Statut, StatutProjet, PlanificationProduction
+from models import Statut, StatutProjet, ConflitAllocation
 import pandas as pd
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
-from datetime import datetime
 from Pages._production_component import st_production_planning
+from Others.analyse_production import analyser_plan
 
 def Page_plan_production():
     st.markdown("""
@@ -22,6 +21,10 @@ def Page_plan_production():
                 background-color: #d1fae5 !important;
                 color: #065f46 !important;
             }
+            .off {
+                background-color: #f1f5f9 !important;
+                color: #64748b !important;
+            }
             .capacity-edit {
                 display: flex;
                 align-items: center;
@@ -43,70 +46,116 @@ def Page_plan_production():
     
     # Initialisation
     if not hasattr(st.session_state, 'projets'):
-        st.session_state.projets = st.session_state.db.charger_tous_projets()
+        st.session_state.projets = st.session_state.depot.projets()
     
-    planification = PlanificationProduction(st.session_state.db)
+    # Plan partagé entre les reruns : relu seulement si la base a changé
+    planification = st.session_state.planification
+    planification.actualiser()
     
     # Section Plan de Production
     st.title("Plan de Production")
     
-    # Get the planning data once
-    project_list, manuf_plan = planification.get_all_production_data()
-    semaines = planification.obtenir_semaines(True)[:12]
-    capacites = [s.capacite for s in semaines[:12]]
+    if st.button("Planification automatique", help="Alloue les murs non alloués des projets en fabrication selon la capacité des semaines"):
+        try:
+            allocations, non_planifiees = planification.planifier_automatiquement()
+            st.session_state.message_planification = (
+                f"{len(allocations)} murs alloués, {len(non_planifiees)} sans place sur les 52 prochaines semaines"
+            )
+            st.rerun()
+        except ConflitAllocation as e:
+            st.error(str(e))
+    if 'message_planification' in st.session_state:
+        st.success(st.session_state.pop('message_planification'))
+    
+    # Get the planning data once : semaine actuelle + 25 semaines
+    matrice = planification.matrice_production(maxSemaines=26, seulementTravaillees=False)
+    matrice_12 = matrice.premieres_semaines(12, seulementTravaillees=True)
+    analyse = analyser_plan(matrice)
+    
+    # Indicateurs de charge
+    display_indicateurs_production(analyse)
     
     # Afficher le plan de production
-    display_table_production_schedule(planification)
+    display_table_production_schedule(planification, matrice, analyse)
+    
+    # Échéances de pose des projets
+    display_echeances_projets(planification.analyser_echeances(st.session_state.projets))
 
     # Afficher le graphique de production
-    display_graph_production_schedule(12, project_list, manuf_plan, capacites)
+    display_graph_production_schedule(12, matrice_12.projets, matrice_12.valeurs, matrice_12.capacites)
     
     # Section Réallocation des Murs
-    display_allocation_murs(planification, project_list)
+    display_allocation_murs(planification, matrice_12.projets, matrice_12.semaines)
+
+def display_indicateurs_production(analyse):
+    """Affiche les indicateurs de charge du plan de production"""
+    col1, col2, col3, col4 = st.columns(4)
+    utilisation = analyse.utilisation_moyenne
+    with col1:
+        st.metric("Utilisation moyenne", f"{utilisation:.0%}" if utilisation is not None else "-")
+    with col2:
+        st.metric("Semaines en surcharge", len(analyse.semaines_surchargees))
+    with col3:
+        st.metric("Retard cumulé (murs)", analyse.backlog[-1] if analyse.backlog else 0)
+    with col4:
+        st.metric("Tendance du débit", f"{analyse.tendance:+.1f} murs/sem.")
+    
+    matrice = analyse.matrice
+    if matrice.projet_ids:
+        with st.expander("Fin prévue par projet"):
+            st.table([
+                {
+                    "Projet": nom,
+                    "Murs non alloués": analyse.restant_projets[projet_id],
+                    "Fin prévue": (f"S{analyse.fin_projets[projet_id][1]} {analyse.fin_projets[projet_id][0]}"
+                                   if analyse.fin_projets[projet_id] else "Non planifié"),
+                }
+                for projet_id, nom in zip(matrice.projet_ids, matrice.projets)
+            ])
+
+def display_echeances_projets(echeances):
+    """Affiche la faisabilité des projets en fabrication par rapport à leur semaine de pose"""
+    if not echeances:
+        return
+    a_risque = [e for e in echeances if e.a_risque]
+    if a_risque:
+        st.error(f"{len(a_risque)} projet(s) à risque : {', '.join(e.nom for e in a_risque)}")
+    with st.expander("Échéances de pose", expanded=bool(a_risque)):
+        def semaine(cle):
+            return f"S{cle[1]} {cle[0]}" if cle else "-"
+        st.table([
+            {
+                "Projet": e.nom,
+                "Pose visée": semaine(e.semaine_pose),
+                "Murs restants": e.murs_restants,
+                "Début au plus tard": semaine(e.debut_au_plus_tard) if e.marge is None or e.marge >= 0 else "Irréalisable",
+                "Marge (semaines)": e.marge if e.marge is not None else "-",
+                "Fin prévue": semaine(e.fin_prevue),
+                "À risque": "⚠️" if e.a_risque else "",
+            }
+            for e in echeances
+        ])
 
-def display_table_production_schedule(planification):
+def display_table_production_schedule(planification, matrice, analyse=None):
     """Display the production planning table with edit capabilities"""
     # Mode édition
     edit_mode = st.checkbox("Mode édition", key="edit_mode_table")
     
-    # Calcul des semaines
-    current_week = datetime.now().isocalendar()[1]
-    week_range = 26  # semaine actuelle + 25 semaines
-    
-    # Année courante
-    annee = datetime.now().year
-    
-    # Récupérer les données dans l'ordre
-    semaines = planification.obtenir_semaines(
-        seulementTravaillees=True,
-        debutSemaine=current_week,
-        maxSemaines=week_range
-    )
-    
-    project_list, manuf_plan = planification.get_all_production_data()
-    
     # Préparer les données pour le composant
-    projects_data = []
-    for i, project in enumerate(project_list):
-        if project not in ["Total", "Capacité"]:
-            projects_data.append({
-                "name": project,
-                "values": manuf_plan[i]
-            })
-    
-    # Obtenir les capacités des semaines
-    capacites = [s.capacite for s in semaines]
-    
-    # Calculer les totaux par semaine
-    total_par_semaine = [0] * len(manuf_plan[0]) if manuf_plan else [0] * week_range
-    for projet_data in manuf_plan:
-        for i, val in enumerate(projet_data):
-            total_par_semaine[i] += val
+    projects_data = [
+        {"name": project, "values": valeurs}
+        for project, valeurs in zip(matrice.projets, matrice.valeurs)
+    ]
     
     component_data = {
         "projects": projects_data,
-        "totalPerWeek": total_par_semaine,
-        "capacities": capacites
+        "totalPerWeek": matrice.totaux,
+        "capacities": matrice.capacites,
+        "weekStatus": analyse.statuts if analyse else None,
+        "weeks": [
+            {"annee": s.annee, "numero": s.numero, "travaillee": s.est_travaillee}
+            for s in matrice.semaines
+        ]
     }
     
     # Utiliser le composant
@@ -115,24 +164,68 @@ def display_table_production_schedule(planification):
         edit_mode=edit_mode
     )
 
-    # Traiter les mises à jour
-    if isinstance(update_value, dict):
+    # Traiter les mises à jour (le composant renvoie sa dernière valeur à chaque rerun)
+    if isinstance(update_value, dict) and update_value != st.session_state.get('derniere_maj_plan'):
         try:
             if 'type' in update_value and 'weekNumber' in update_value and 'value' in update_value:
                 update_type = update_value['type']
                 week_num = update_value['weekNumber']
+                annee = update_value.get('year') or planification.obtenir_annee_actuelle()
                 value = update_value['value']
                 
+                replanification = None
                 if update_type == "capacity":
-                    planification.definir_capacite_semaine(annee, week_num, int(value))
-                    st.rerun()
+                    replanification = planification.simuler_replanification(annee, week_num, capacite=int(value))
                 elif update_type == "worked":
-                    planification.definir_semaine_travaillee(annee, week_num, bool(value))
+                    replanification = planification.simuler_replanification(annee, week_num, est_travaillee=bool(value))
+                
+                if replanification:
+                    st.session_state.derniere_maj_plan = update_value
+                    if replanification.deplacements or replanification.sans_place:
+                        # Aperçu à confirmer avant de déplacer des murs
+                        st.session_state.replanification = replanification
+                    else:
+                        planification.appliquer_replanification(replanification)
                     st.rerun()
                     
         except Exception as e:
             st.error(f"Erreur lors de la mise à jour : {str(e)}")
 
+    if 'replanification' in st.session_state:
+        display_apercu_replanification(planification, st.session_state.replanification)
+
+def display_apercu_replanification(planification, replanification):
+    """Affiche les déplacements proposés par la replanification et demande confirmation"""
+    semaine = replanification.semaine
+    st.warning(
+        f"Semaine {semaine.numero} : capacité {replanification.capacite}"
+        f"{'' if replanification.est_travaillee else ', non travaillée'}. "
+        f"{len(replanification.deplacements)} mur(s) à déplacer."
+    )
+    if replanification.deplacements:
+        st.table([
+            {"Mur (id)": instance_id,
+             "Ancienne semaine": f"S{ancienne.numero} {ancienne.annee}",
+             "Nouvelle semaine": f"S{nouvelle.numero} {nouvelle.annee}"}
+            for instance_id, ancienne, nouvelle in replanification.deplacements
+        ])
+    if replanification.sans_place:
+        st.error(f"{len(replanification.sans_place)} mur(s) sans place sur l'horizon resteront en surcharge")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Appliquer la replanification", type="primary"):
+            try:
+                planification.appliquer_replanification(replanification)
+                del st.session_state.replanification
+                st.rerun()
+            except Exception as e:
+                st.error(f"Erreur lors de la replanification : {str(e)}")
+    with col2:
+        if st.button("Annuler", key="annuler_replanification"):
+            del st.session_state.replanification
+            st.rerun()
+
 def display_graph_production_schedule(num_weeks, projects, manuf_plan, capacites):
     """
     Affiche le graphique de production avec tous les projets
@@ -199,13 +292,12 @@ def display_graph_production_schedule(num_weeks, projects, manuf_plan, capacites
     # Afficher le graphique
     st.plotly_chart(fig, use_container_width=True)
 
-def display_allocation_murs(planification, project_list):
+def display_allocation_murs(planification, project_list, semaines=None):
     """
     Display and manage wall allocation to production weeks
     """
     st.subheader("Allocation des murs aux semaines de production")
     
-    instances_allocations = st.session_state.db.charger_allocations_instances()
     projets_filtres = [p for p in project_list if p not in ['Total', 'Capacité']]
     
     projet_nom = st.selectbox(
@@ -217,26 +309,47 @@ def display_allocation_murs(planification, project_list):
     if projet_nom:
         projet = next((p for p in st.session_state.projets if p.nom == projet_nom), None)
         if projet and projet.instances_mur:
-            semaines = planification.obtenir_semaines(True)[:12]
+            if semaines is None:
+                semaines = planification.obtenir_semaines(True)[:12]
             options_semaines = [(None, "Non allouée")] + [
-                (s.numero, f"Semaine {s.numero} ({s.capacite} murs max)") 
+                ((s.annee, s.numero), f"Semaine {s.numero} ({s.capacite} murs max)") 
                 for s in semaines
             ]
             
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                delta_semaines = st.number_input(
+                    "Décaler tous les murs alloués du projet (semaines travaillées)",
+                    min_value=-26, max_value=26, value=0, step=1,
+                    key=f"delta_{projet.id}"
+                )
+            with col2:
+                if st.button("Décaler le projet", key=f"deplacer_{projet.id}", disabled=delta_semaines == 0):
+                    try:
+                        nb_murs = planification.deplacer_projet(projet, int(delta_semaines))
+                        # Les sélections par mur doivent relire les nouvelles allocations
+                        for instance in projet.instances_mur:
+                            st.session_state.pop(f"alloc_{instance.id}", None)
+                            st.session_state.pop(f"prev_{instance.id}", None)
+                        st.session_state.message_planification = f"{nb_murs} murs décalés de {delta_semaines} semaine(s)"
+                        st.rerun()
+                    except ValueError as e:
+                        st.error(str(e))
+            
             col1, col2, col3 = st.columns([3, 2, 1])
             with col1:
                 st.write("**Mur**")
             with col2:
                 st.write("**Semaine allouée**")
             
-            annee = datetime.now().year
-            
             for instance in projet.instances_mur:
                 key_selectbox = f"alloc_{instance.id}"
                 key_previous = f"prev_{instance.id}"
                 key_success = f"success_{instance.id}"
                 
-                semaine_actuelle = instances_allocations.get(instance.id)
+                # Index instance -> semaine du planificateur : aucune requête par rerun
+                semaine_allouee = planification.obtenir_semaine_instance(instance.id)
+                semaine_actuelle = (semaine_allouee.annee, semaine_allouee.numero) if semaine_allouee else None
                 
                 if key_previous not in st.session_state:
                     st.session_state[key_previous] = semaine_actuelle
@@ -248,7 +361,7 @@ def display_allocation_murs(planification, project_list):
                     nouvelle_semaine = st.selectbox(
                         "Semaine",
                         [s[0] for s in options_semaines],
-                        format_func=lambda x: "Non allouée" if x is None else f"Semaine {x}",
+                        format_func=lambda x: "Non allouée" if x is None else f"Semaine {x[1]} - {x[0]}",
                         key=key_selectbox,
                         index=next((i for i, s in enumerate(options_semaines) if s[0] == semaine_actuelle), 0)
                     )
@@ -256,17 +369,19 @@ def display_allocation_murs(planification, project_list):
                     if nouvelle_semaine != st.session_state[key_previous]:
                         if st.button("Sauvegarder", key=f"save_{instance.id}"):
                             try:
-                                if st.session_state[key_previous] is not None:
+                                # Une nouvelle allocation remplace l'ancienne dans la même transaction :
+                                # en cas de conflit, le mur reste dans sa semaine
+                                if nouvelle_semaine is None and st.session_state[key_previous] is not None:
                                     ancienne_semaine = planification.obtenir_semaine(
-                                        annee, st.session_state[key_previous])
+                                        *st.session_state[key_previous])
                                     if ancienne_semaine:
-                                        ancienne_semaine.retirer_instance_mur(instance, st.session_state.db)
+                                        planification.retirer_instance_mur(ancienne_semaine, instance)
                                 
                                 if nouvelle_semaine is not None:
                                     nouvelle_sem = planification.obtenir_semaine(
-                                        annee, nouvelle_semaine)
+                                        *nouvelle_semaine)
                                     if nouvelle_sem:
-                                        nouvelle_sem.allouer_instance_mur(instance, st.session_state.db)
+                                        planification.allouer_instance_mur(nouvelle_sem, instance)
                                 
                                 st.session_state[key_previous] = nouvelle_semaine
                                 st.session_state[key_success] = True
@@ -279,7 +394,7 @@ def display_allocation_murs(planification, project_list):
         else:
             st.info("Aucune instance de mur à afficher pour ce projet")
 
-def st_kanban_board(walls: list, current_week: int) -> dict:
+def st_kanban_board(walls: list, current_week: int, week_labels: list = None) -> dict:
     """Crée un tableau Kanban pour la planification de production"""
     from jinja2 import Template
     import os
@@ -292,7 +407,8 @@ def st_kanban_board(walls: list, current_week: int) -> dict:
     # Rendre le HTML
     rendered_html = template.render(
         walls=walls,
-        current_week=current_week
+        current_week=current_week,
+        week_labels=week_labels or [f"Semaine {current_week + i}" for i in range(12)]
     )
     
     # Calculer la hauteur
@@ -321,8 +437,27 @@ def display_allocation_murs2(planification, project_list):
         projet = next((p for p in st.session_state.projets if p.nom == projet_nom), None)
         if projet and projet.instances_mur:
             # Préparer les données
-            current_week = datetime.now().isocalendar()[1]
-            instances_allocations = st.session_state.db.charger_allocations_instances()
+            current_week = planification.obtenir_semaine_actuelle()
+            instances_allocations = {
+                instance.id: cle
+                for cle, instances in planification.instances_par_semaine(projet.id).items()
+                for instance in instances
+            }
+            
+            # Le Kanban numérote ses colonnes à partir de la semaine actuelle : on associe
+            # chaque semaine ISO (annee, numero) de l'horizon à un rang continu
+            cles_horizon = planification.cles_semaines(
+                planification.obtenir_annee_actuelle(), current_week, 12)
+            rangs = {cle: current_week + k for k, cle in enumerate(cles_horizon)}
+            semaine_par_rang = {rang: cle for cle, rang in rangs.items()}
+            
+            def rang_allocation(cle):
+                if cle is None:
+                    return None
+                if cle in rangs:
+                    return rangs[cle]
+                # Avant l'horizon : colonne "Retard" ; après : hors du tableau
+                return current_week - 1 if cle < cles_horizon[0] else current_week + len(cles_horizon)
             
             # Convertir les instances en format attendu par le Kanban
             walls_data = [
@@ -333,13 +468,14 @@ def display_allocation_murs2(planification, project_list):
                         "reference": instance.modele.reference
                     },
                     "status": instance.statut.value,
-                    "allocation": instances_allocations.get(instance.id)
+                    "allocation": rang_allocation(instances_allocations.get(instance.id))
                 }
                 for instance in projet.instances_mur
             ]
             
             # Afficher le Kanban
-            result = st_kanban_board(walls=walls_data, current_week=current_week)
+            result = st_kanban_board(walls=walls_data, current_week=current_week,
+                                     week_labels=[f"Semaine {numero}" for _, numero in cles_horizon])
             
             # Gérer les mises à jour d'allocation
             if result:
@@ -353,19 +489,18 @@ def display_allocation_murs2(planification, project_list):
                     )
                     
                     if instance:
-                        annee = datetime.now().year
                         # Cas où le mur est déplacé vers une semaine
                         if target_week is not None:
-                            nouvelle_sem = planification.obtenir_semaine(annee, target_week)
+                            nouvelle_sem = planification.obtenir_semaine(*semaine_par_rang[target_week])
                             if nouvelle_sem:
-                                nouvelle_sem.allouer_instance_mur(instance, st.session_state.db)
+                                planification.allouer_instance_mur(nouvelle_sem, instance)
                         # Cas où le mur est déplacé vers "Non alloué" ou "Retard"
                         else:
                             current_allocation = instances_allocations.get(instance.id)
                             if current_allocation:
-                                current_sem = planification.obtenir_semaine(annee, current_allocation)
+                                current_sem = planification.obtenir_semaine(*current_allocation)
                                 if current_sem:
-                                    current_sem.retirer_instance_mur(instance, st.session_state.db)
+                                    planification.retirer_instance_mur(current_sem, instance)
                         
                         st.rerun()
                 except Exception as e:
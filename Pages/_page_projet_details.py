@@ -1,6 +1,7 @@
 import streamlit as st
-from models import StatutProjet, TypeDocument, TypeIsolant, ModeleMur, InstanceMur
-from Others.generer_pdf_projet import generer_pdf_projet
+from datetime import date
+from models import StatutProjet, StatutJob, TypeDocument, TypeIsolant, ModeleMur
+from Others.documents import sauvegarder_document
 
 def auto_scroll_to_form():
     scroll_js = """
@@ -13,33 +14,85 @@ def auto_scroll_to_form():
     """
     st.markdown(scroll_js, unsafe_allow_html=True)
 
+def afficher_job_pdf(projet):
+    """Statut de la génération du PDF du projet, exécutée en tâche de fond"""
+    job_id = st.session_state.get('jobs_pdf', {}).get(projet.id)
+    if job_id is None:
+        return
+    jobs = st.session_state.jobs
+    job = jobs.job(job_id)
+    if job.statut == StatutJob.TERMINE:
+        try:
+            with open(job.resultat["chemin"], "rb") as f:
+                pdf = f.read()
+        except OSError:
+            # Le PDF a été retiré du cache entre-temps
+            st.warning("Le PDF n'est plus disponible, veuillez le régénérer")
+            del st.session_state.jobs_pdf[projet.id]
+            return
+        st.success("PDF généré avec succès")
+        st.download_button(
+            label="📥 Télécharger le PDF",
+            data=pdf,
+            file_name=f"projet_{projet.nom}_{projet.date_creation.strftime('%Y%m%d')}.pdf",
+            mime="application/pdf"
+        )
+    elif job.statut == StatutJob.ECHEC:
+        st.error(f"Erreur lors de la génération du PDF: {job.erreur}")
+        if st.button("Réessayer", key="relancer_pdf"):
+            jobs.relancer(job_id)
+            st.rerun()
+    else:
+        st.info("Génération du PDF en cours...")
+        if st.button("Actualiser", key="actualiser_pdf"):
+            st.rerun()
+
+def afficher_jobs_instances(projet):
+    """Statut des créations et suppressions d'instances en cours pour le projet"""
+    job_ids = st.session_state.get('jobs_instances', {}).get(projet.id, [])
+    if not job_ids:
+        return
+    jobs = st.session_state.jobs
+    restants = []
+    en_cours = False
+    for job_id in job_ids:
+        job = jobs.job(job_id)
+        if job.statut == StatutJob.TERMINE:
+            continue  # Les projets sont rechargés au prochain rerun
+        restants.append(job_id)
+        if job.statut == StatutJob.ECHEC:
+            st.error(f"Erreur lors de la mise à jour des instances: {job.erreur}")
+            if st.button("Réessayer", key=f"relancer_instances_{job_id}"):
+                jobs.relancer(job_id)
+                st.rerun()
+        else:
+            en_cours = True
+    if en_cours:
+        st.info("Mise à jour des instances en cours...")
+        if st.button("Actualiser", key="actualiser_instances"):
+            st.rerun()
+    st.session_state.jobs_instances[projet.id] = restants
+
+def soumettre_nombre_instances(projet, modele, nb_instances):
+    """Crée ou supprime les instances du modèle en tâche de fond"""
+    job_id = st.session_state.jobs.soumettre(
+        "nombre_instances", projet_id=projet.id, modele_id=modele.id, nb_instances=nb_instances)
+    st.session_state.setdefault('jobs_instances', {}).setdefault(projet.id, []).append(job_id)
+
 def Page_projet_details():
     if not hasattr(st.session_state, 'projet_details'):
         st.error("Aucun projet sélectionné")
         return
         
     if not hasattr(st.session_state, 'projets'):
-        st.session_state.projets = st.session_state.db.charger_tous_projets()
+        st.session_state.projets = st.session_state.depot.projets()
     
     projet = next((p for p in st.session_state.projets if p.id == st.session_state.projet_details), None)
     if not projet:
         st.error("Projet non trouvé")
         return
         
-    if hasattr(st.session_state, 'generer_pdf') and st.session_state.generer_pdf:
-        st.write("Génération du PDF en cours...")
-        try:
-            pdf = generer_pdf_projet(projet)
-            st.success("PDF généré avec succès")
-            st.download_button(
-                label="📥 Télécharger le PDF",
-                data=pdf,
-                file_name=f"projet_{projet.nom}_{projet.date_creation.strftime('%Y%m%d')}.pdf",
-                mime="application/pdf"
-            )
-        except Exception as e:
-            st.error(f"Erreur lors de la génération du PDF: {str(e)}")
-        del st.session_state.generer_pdf
+    afficher_job_pdf(projet)
     
     with st.sidebar:
         st.header("Navigation")
@@ -50,7 +103,8 @@ def Page_projet_details():
                 st.rerun()
         with col2:
             if st.button("📄 Générer PDF"):
-                st.session_state.generer_pdf = True
+                st.session_state.setdefault('jobs_pdf', {})[projet.id] = st.session_state.jobs.soumettre(
+                    "pdf_projet", projet_id=projet.id)
                 st.rerun()
         st.divider()
         
@@ -71,15 +125,33 @@ def Page_projet_details():
     else:
         st.write("**Adresse:**  \nNon spécifiée")
     
+    # Semaine de pose visée : la date choisie est ramenée à sa semaine ISO
+    col_pose, col_pose_btn = st.columns([0.7, 0.3])
+    with col_pose:
+        date_pose = st.date_input(
+            "Semaine de pose visée",
+            value=date.fromisocalendar(*projet.semaine_pose, 1) if projet.semaine_pose else None,
+            key=f"date_pose_{projet.id}"
+        )
+    semaine_pose = tuple(date_pose.isocalendar()[:2]) if date_pose else None
+    with col_pose_btn:
+        if semaine_pose != projet.semaine_pose and st.button("Enregistrer la semaine de pose"):
+            projet.semaine_pose = semaine_pose
+            projet.modifier(st.session_state.db)
+            st.rerun()
+    if projet.semaine_pose:
+        st.write(f"**Pose visée:** semaine {projet.semaine_pose[1]} de {projet.semaine_pose[0]}")
+    
     st.header("Documents", anchor="documents")
     col_upload, col_filter = st.columns([0.7, 0.3])
     with col_upload:
         nouveaux_docs = st.file_uploader("Ajouter des documents", accept_multiple_files=True)
         if nouveaux_docs:
-            for doc in nouveaux_docs:
-                document = sauvegarder_document(doc, TypeDocument.AUTRE)  # Par défaut
-                document.sauvegarder(st.session_state.db, projet_id=projet.id)
-                projet.documents.append(document)
+            with st.session_state.session as session:
+                for doc in nouveaux_docs:
+                    document = sauvegarder_document(doc, TypeDocument.AUTRE)  # Par défaut
+                    document.sauvegarder(session, projet_id=projet.id)
+                    projet.documents.append(document)
             st.success("Documents ajoutés avec succès!")
             st.rerun()
     with col_filter:
@@ -89,8 +161,7 @@ def Page_projet_details():
     st.info("Fonctionnalité à venir")
 
     st.header("Coût", anchor="cout")
-    cout_total = sum(round(modele.cout * len(modele.instances), 2) for modele in projet.modeles_mur) if projet.modeles_mur else 0
-    st.metric("Coût total estimé", f"{cout_total}€")
+    st.metric("Coût total estimé", f"{projet.cout_total}€")
     if projet.modeles_mur:
         st.write("**Détail des coûts:**")
         for modele in projet.modeles_mur:
@@ -98,6 +169,7 @@ def Page_projet_details():
             st.write(f"- Modèle {modele.reference}: {modele.cout}€ × {len(modele.instances)} instances = {cout_modele}€")
 
     st.header("Murs", anchor="murs")
+    afficher_jobs_instances(projet)
     if projet.statut != StatutProjet.EN_CONCEPTION:
         st.error("Le projet n'est plus en conception et il n'est plus possible de modifier les murs")
     if projet.statut == StatutProjet.EN_CONCEPTION:
@@ -145,20 +217,9 @@ def Page_projet_details():
                         modele.epaisseur = epaisseur
                         modele.isolant = isolant
                         
-                        current_instances = len(modele.instances)
-                        if nb_instances > current_instances:
-                            # Ajout de nouvelles instances
-                            for i in range(current_instances, nb_instances):
-                                instance = InstanceMur(i+1, modele)
-                                instance.sauvegarder(st.session_state.db, projet.id, modele.id)
-                                modele.instances.append(instance)
-                                projet.instances_mur.append(instance)
-                        elif nb_instances < current_instances:
-                            # Suppression des instances en trop
-                            for instance in modele.instances[nb_instances:]:
-                                instance.supprimer(st.session_state.db)
-                                projet.instances_mur.remove(instance)
-                            modele.instances = modele.instances[:nb_instances]
+                        # Ajout ou suppression des instances en tâche de fond
+                        if nb_instances != len(modele.instances):
+                            soumettre_nombre_instances(projet, modele, nb_instances)
                             
                         modele.modifier(st.session_state.db)
                         del st.session_state.modele_a_modifier
@@ -168,12 +229,8 @@ def Page_projet_details():
                         new_modele.calculer_cout()  # Calcul du coût avant sauvegarde
                         new_modele.sauvegarder(st.session_state.db, projet.id)
                         
-                        # Création des instances
-                        for i in range(nb_instances):
-                            instance = InstanceMur(i+1, new_modele)
-                            instance.sauvegarder(st.session_state.db, projet.id, new_modele.id)
-                            new_modele.instances.append(instance)
-                            projet.instances_mur.append(instance)
+                        # Création des instances en tâche de fond
+                        soumettre_nombre_instances(projet, new_modele, nb_instances)
                         
                         projet.modeles_mur.append(new_modele)
                         del st.session_state.nouveau_modele
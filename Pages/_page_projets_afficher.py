@@ -5,7 +5,7 @@ from datetime import datetime
 
 def Page_projets_afficher():
     if not hasattr(st.session_state, 'projets'):
-        st.session_state.projets = st.session_state.db.charger_tous_projets()
+        st.session_state.projets = st.session_state.depot.projets()
     
     st.header("Gestion des Projets")
     
@@ -86,16 +86,14 @@ def Page_projets_afficher():
                 projet.code_postal = code_postal
                 projet.ville = ville
                 
-                # Sauvegarder le projet
-                projet = projet.sauvegarder(st.session_state.db)
-                
-                # Sauvegarder les documents avec leurs types
-                if documents_data:
+                # Projet et documents enregistrés en une seule transaction à la sortie du bloc
+                with st.session_state.session as session:
+                    projet = projet.sauvegarder(session)
                     for doc, type_doc in documents_data:
                         document = sauvegarder_document(doc, type_doc)
-                        document.sauvegarder(st.session_state.db, projet_id=projet.id)
+                        document.sauvegarder(session, projet_id=projet)
                 
-                st.session_state.projets = st.session_state.db.charger_tous_projets()
+                st.session_state.projets = st.session_state.depot.projets()
                 st.session_state.document_list = []  # Réinitialiser la liste
                 st.session_state.afficher_form_projet = False
                 st.success("Projet créé avec succès!")
@@ -105,6 +103,9 @@ def Page_projets_afficher():
                 st.session_state.afficher_form_projet = False
                 st.rerun()
 
+    # Totaux tenus à jour en base, relus par le dépôt seulement après une écriture
+    agregats = st.session_state.depot.agregats()
+    
     # Affichage des projets par statut
     for statut in StatutProjet:
         projets = projets_par_statut[statut]
@@ -209,7 +210,7 @@ def Page_projets_afficher():
                                         document.sauvegarder(st.session_state.db, projet_id=projet.id)
 
                                 projet.modifier(st.session_state.db)
-                                st.session_state.projets = st.session_state.db.charger_tous_projets()
+                                st.session_state.projets = st.session_state.depot.projets()
                                 st.session_state[f"edit_mode_{projet_id}"] = False
                                 st.success("Projet modifié avec succès!")
                                 st.rerun()
@@ -220,7 +221,7 @@ def Page_projets_afficher():
                                 
                             if delete:
                                 projet.supprimer(st.session_state.db)
-                                st.session_state.projets = st.session_state.db.charger_tous_projets()
+                                st.session_state.projets = st.session_state.depot.projets()
                                 st.success("Projet supprimé avec succès!")
                                 st.rerun()
                     
@@ -231,6 +232,14 @@ def Page_projets_afficher():
                         if projet.adresse_postale or projet.code_postal or projet.ville:
                             st.write(f"**Adresse:**  \n{projet.adresse_postale}   \n{projet.code_postal} {projet.ville}")
                         
+                        agregat = agregats.get(projet.id)
+                        if agregat:
+                            st.write(f"**Coût total estimé:** {agregat.cout_total}€")
+                            st.write(f"**Murs:** {agregat.nb_modeles} modèle(s), {agregat.nb_instances} instance(s) ("
+                                     + ", ".join(f"{nb} {statut.value.lower()}" for statut, nb in agregat.instances_par_statut.items())
+                                     + f"), {agregat.nb_murs_alloues} allouée(s) en production, "
+                                     f"{agregat.nb_murs_non_alloues} non allouée(s)")
+                        
                         col1, col2, col3 = st.columns(3)
                         with col1:
                             if st.button("Configurer", key=f"config_{projet.id}"):
@@ -243,6 +252,6 @@ def Page_projets_afficher():
                         with col3:
                             if st.button("Supprimer", key=f"delete_{projet.id}"):
                                 projet.supprimer(st.session_state.db)
-                                st.session_state.projets = st.session_state.db.charger_tous_projets()
+                                st.session_state.projets = st.session_state.depot.projets()
                                 st.success("Projet supprimé avec succès!")
                                 st.rerun()
\ No newline at end of file
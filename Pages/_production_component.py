@@ -1,13 +1,17 @@
 import streamlit.components.v1 as components
 from jinja2 import Template
-from datetime import datetime
+from datetime import datetime, timedelta
 
 def st_production_planning(data: dict, edit_mode: bool = False, key=None):
     """Create a production planning table component"""
-    # Calcul des semaines à afficher
-    current_week = datetime.now().isocalendar()[1]
-    end_week = current_week + 25
-    weeks = list(range(current_week, end_week + 1))
+    # Semaines à afficher : clés ISO fournies par la page, sinon les 26 semaines à venir
+    weeks = data.get("weeks")
+    if weeks is None:
+        lundi = datetime.now().date() - timedelta(days=datetime.now().weekday())
+        weeks = [
+            {"annee": jour.isocalendar()[0], "numero": jour.isocalendar()[1], "travaillee": True}
+            for jour in (lundi + timedelta(weeks=k) for k in range(26))
+        ]
     
     # HTML du composant
     html = """
@@ -18,7 +22,7 @@ def st_production_planning(data: dict, edit_mode: bool = False, key=None):
                     <tr>
                         <th>Projet</th>
                         {% for week in weeks %}
-                            <th>S{{ week }}</th>
+                            <th title="{{ week['annee'] }}">S{{ week['numero'] }}</th>
                         {% endfor %}
                     </tr>
                 </thead>
@@ -34,7 +38,7 @@ def st_production_planning(data: dict, edit_mode: bool = False, key=None):
                     <tr>
                         <td style="text-align: left"><strong>Total</strong></td>
                         {% for total in data['totalPerWeek'] %}
-                            <td><strong>{{ total }}</strong></td>
+                            <td class="{{ data['weekStatus'][loop.index0] if data.get('weekStatus') else '' }}"><strong>{{ total }}</strong></td>
                         {% endfor %}
                     </tr>
                     <tr>
@@ -47,12 +51,14 @@ def st_production_planning(data: dict, edit_mode: bool = False, key=None):
                                                value="{{ capacity }}"
                                                min="0" 
                                                max="20" 
-                                               data-week="{{ weeks[loop.index0] }}"
+                                               data-week="{{ weeks[loop.index0]['numero'] }}"
+                                               data-year="{{ weeks[loop.index0]['annee'] }}"
                                                class="capacity-input"
                                                onchange="handleCapacityChange(event)"/>
                                         <input type="checkbox" 
-                                               data-week="{{ weeks[loop.index0] }}"
-                                               checked
+                                               data-week="{{ weeks[loop.index0]['numero'] }}"
+                                               data-year="{{ weeks[loop.index0]['annee'] }}"
+                                               {% if weeks[loop.index0]['travaillee'] %}checked{% endif %}
                                                class="worked-checkbox"
                                                onchange="handleWorkedChange(event)"/>
                                     </div>
@@ -69,6 +75,7 @@ def st_production_planning(data: dict, edit_mode: bool = False, key=None):
         <script>
             function handleCapacityChange(event) {
                 const weekNum = parseInt(event.target.dataset.week);
+                const year = parseInt(event.target.dataset.year);
                 const value = parseInt(event.target.value);
                 
                 parent.postMessage({
@@ -76,6 +83,7 @@ def st_production_planning(data: dict, edit_mode: bool = False, key=None):
                     value: {
                         type: 'capacity',
                         weekNumber: weekNum,
+                        year: year,
                         value: value
                     }
                 }, "*");
@@ -83,6 +91,7 @@ def st_production_planning(data: dict, edit_mode: bool = False, key=None):
             
             function handleWorkedChange(event) {
                 const weekNum = parseInt(event.target.dataset.week);
+                const year = parseInt(event.target.dataset.year);
                 const value = event.target.checked;
                 
                 parent.postMessage({
@@ -90,6 +99,7 @@ def st_production_planning(data: dict, edit_mode: bool = False, key=None):
                     value: {
                         type: 'worked',
                         weekNumber: weekNum,
+                        year: year,
                         value: value
                     }
                 }, "*");
@@ -117,6 +127,26 @@ def st_production_planning(data: dict, edit_mode: bool = False, key=None):
                 border: 1px solid #e2e8f0;
             }
             
+            .overload {
+                background-color: #fee2e2;
+                color: #991b1b;
+            }
+            
+            .underload {
+                background-color: #dbeafe;
+                color: #1e40af;
+            }
+            
+            .optimal {
+                background-color: #d1fae5;
+                color: #065f46;
+            }
+            
+            .off {
+                background-color: #f1f5f9;
+                color: #64748b;
+            }
+            
             .capacity-cell {
                 display: flex;
                 align-items: center;
@@ -1,5 +1,9 @@
 import streamlit as st
 from bdd.database import DatabaseManager
+from bdd.depot import DepotProjets
+from bdd.session import Session
+from models import PlanificationProduction
+from Others.jobs import FileJobs
 from Pages._page_projets_afficher import Page_projets_afficher
 from Pages._page_projet_details import Page_projet_details
 from Pages._page_plan_production import Page_plan_production
@@ -13,15 +17,44 @@ st.set_page_config(
     menu_items={}, 
 )
 
+@st.cache_resource
+def obtenir_db():
+    """DatabaseManager unique pour le processus, partagé par toutes les sessions"""
+    return DatabaseManager()
+
+@st.cache_resource
+def obtenir_session(_db):
+    """Carte d'identité partagée : le dépôt et le plan de production voient les mêmes objets"""
+    return Session(_db)
+
+@st.cache_resource
+def obtenir_depot(_db, _session):
+    """Dépôt de projets partagé, rechargé uniquement après une écriture en base"""
+    return DepotProjets(_db, _session)
+
+@st.cache_resource
+def obtenir_planification(_db, _session):
+    """Plan de production partagé, rechargé uniquement après une écriture en base"""
+    return PlanificationProduction(_db, _session)
+
+@st.cache_resource
+def obtenir_jobs(_db):
+    """File de tâches de fond du processus, reprend les jobs interrompus au démarrage"""
+    return FileJobs(_db)
+
 def main():
     # Initialisation des états
     if 'db' not in st.session_state:
-        st.session_state.db = DatabaseManager()
+        st.session_state.db = obtenir_db()
+        st.session_state.session = obtenir_session(st.session_state.db)
+        st.session_state.depot = obtenir_depot(st.session_state.db, st.session_state.session)
+        st.session_state.planification = obtenir_planification(st.session_state.db, st.session_state.session)
+        st.session_state.jobs = obtenir_jobs(st.session_state.db)
         st.session_state.projets = []
         st.session_state.page = 'projets'
     
-    # Utilisation de charger_tous_projets au lieu de charger_projets
-    st.session_state.projets = st.session_state.db.charger_tous_projets()
+    # Instantané partagé : aucune requête SQL si rien n'a été modifié depuis le dernier rerun
+    st.session_state.projets = st.session_state.depot.projets()
     
     # Logo et en-tête
     file_ = open("assets/ob2-logo.png", "rb")
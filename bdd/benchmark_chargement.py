@@ -0,0 +1,74 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import List, Optional
+from bdd.database import DatabaseManager
+from models import Statut, StatutProjet, TypeDocument, TypeIsolant
+
+def remplir_base_synthetique(db, nb_projets, modeles_par_projet=4, instances_par_modele=10,
+                             statut=StatutProjet.EN_CONCEPTION):
+    """Insère des projets synthétiques avec leurs modèles, ouvertures, instances et documents"""
+    maintenant = datetime.now().isoformat()
+    with db.transaction() as cur:
+        for p in range(nb_projets):
+            cur.execute("""
+                INSERT INTO projets (nom, description, adresse_postale, code_postal, ville, date_creation, statut)
+                VALUES (?, '', '', '', '', ?, ?)
+            """, (f"Projet {p}", maintenant, statut.value))
+            projet_id = cur.lastrowid
+            cur.execute("""
+                INSERT INTO documents (nom, type, chemin, date_creation, projet_id) VALUES (?, ?, '', ?, ?)
+            """, (f"plan_{p}.pdf", TypeDocument.PLAN.value, maintenant, projet_id))
+            for m in range(modeles_par_projet):
+                cur.execute("""
+                    INSERT INTO modeles_mur (projet_id, reference, longueur, hauteur, epaisseur, cout, statut, isolant)
+                    VALUES (?, ?, 300, 250, 40, 1000, ?, ?)
+                """, (projet_id, f"M{m}", Statut.EN_COURS.value, TypeIsolant.PAILLE.value))
+                modele_id = cur.lastrowid
+                cur.execute("""
+                    INSERT INTO ouvertures (modele_mur_id, type, largeur, hauteur, position_x, position_y)
+                    VALUES (?, 'Fenêtre', 100, 120, 50, 90)
+                """, (modele_id,))
+                cur.executemany("""
+                    INSERT INTO instances_mur (modele_mur_id, projet_id, numero, statut) VALUES (?, ?, ?, ?)
+                """, [(modele_id, projet_id, n, Statut.EN_COURS.value) for n in range(1, instances_par_modele + 1)])
+
+def compter_requetes_chargement(db) -> int:
+    """Nombre d'instructions SQL exécutées par charger_tous_projets"""
+    requetes = []
+    conn = db.get_connection()
+    conn.set_trace_callback(requetes.append)
+    try:
+        db.charger_tous_projets()
+    finally:
+        conn.set_trace_callback(None)
+    return len(requetes)
+
+def main(arguments: Optional[List[str]] = None):
+    """Vérifie que le chargement des projets exécute un nombre de requêtes indépendant du nombre de projets"""
+    parser = argparse.ArgumentParser(description="Compte les requêtes SQL de charger_tous_projets")
+    parser.add_argument("--projets", type=int, nargs="+", default=[10, 50, 200], help="Nombres de projets testés")
+    args = parser.parse_args(arguments)
+
+    nb_requetes = {}
+    with tempfile.TemporaryDirectory() as dossier:
+        for nb_projets in args.projets:
+            db = DatabaseManager(os.path.join(dossier, f"benchmark_{nb_projets}.db"))
+            try:
+                remplir_base_synthetique(db, nb_projets)
+                nb_requetes[nb_projets] = compter_requetes_chargement(db)
+                debut = time.perf_counter()
+                projets = db.charger_tous_projets()
+                duree = time.perf_counter() - debut
+            finally:
+                db.fermer()
+            assert len(projets) == nb_projets
+            print(f"{nb_projets} projets: {nb_requetes[nb_projets]} requêtes, {duree * 1000:.1f} ms")
+
+    assert len(set(nb_requetes.values())) == 1, f"Le nombre de requêtes dépend du nombre de projets: {nb_requetes}"
+    print("Nombre de requêtes constant")
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,121 @@
+import json
+import os
 import sqlite3
-from datetime import datetime
-from models import (Projet, ModeleMur, InstanceMur, Document, TypeDocument, 
-                   TypeIsolant, Ouverture, Statut, StatutProjet, SemainePlanDeProduction)
+import threading
+import weakref
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
+from Cout.cache_couts import CacheCouts
+from models import (Projet, ModeleMur, InstanceMur, Document, TypeDocument, Job, StatutJob, AgregatsProjet,
+                   TypeIsolant, Ouverture, Statut, StatutProjet, SemainePlanDeProduction,
+                   ConflitAllocation)
+
+DOSSIER_MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+class _JetonThread:
+    """Objet propre à un thread, détruit avec lui : sert à libérer sa connexion"""
 
 class DatabaseManager:
+    TAILLE_CACHE_PAGES_KO = 20000  # Cache de pages SQLite par connexion (en Ko)
+    TAILLE_CACHE_REQUETES = 256  # Requêtes préparées conservées par connexion
+    TAILLE_POOL = 8  # Connexions inactives conservées pour les threads suivants
+
     def __init__(self, db_file="bdd/construction_projects.db"):
         self.db_file = db_file
+        self._local = threading.local()
+        self._pool = []  # Connexions libérées par les threads terminés
+        self._verrou_pool = threading.Lock()
+        # Incrémenté à chaque transaction validée qui a modifié la base
+        self.compteur_modifications = 0
+        self._verrou_compteur = threading.Lock()
         self.init_database()
+        self.cache_couts = CacheCouts(self)
 
-    def get_connection(self):
-        conn = sqlite3.connect(self.db_file)
+    def _ouvrir_connexion(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False,
+                               cached_statements=self.TAILLE_CACHE_REQUETES)
         conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{self.TAILLE_CACHE_PAGES_KO}")
         return conn
 
-    def init_database(self):
+    def _rendre_connexion(self, conn):
+        """Remet dans le pool la connexion d'un thread terminé"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._verrou_pool:
+                if len(self._pool) < self.TAILLE_POOL:
+                    self._pool.append(conn)
+                    return
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass  # Connexion déjà fermée
+
+    def get_connection(self):
+        """Retourne la connexion attribuée au thread courant.
+
+        Chaque thread garde la même connexion tant qu'il vit ; elle retourne au pool
+        quand le thread se termine (les reruns Streamlit changent de thread).
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            with self._verrou_pool:
+                conn = self._pool.pop() if self._pool else None
+            if conn is None:
+                conn = self._ouvrir_connexion()
+            jeton = _JetonThread()
+            weakref.finalize(jeton, self._rendre_connexion, conn)
+            self._local.jeton = jeton
+            self._local.conn = conn
+            self._local.profondeur = 0
+        return conn
+
+    @contextmanager
+    def transaction(self, immediate=False, invalider_caches=True):
+        """Exécute un bloc dans une transaction : commit à la fin, rollback en cas d'erreur.
+
+        Les transactions imbriquées rejoignent la transaction englobante, ce qui permet
+        de regrouper plusieurs appels du DatabaseManager dans un seul commit.
+        Avec immediate=True, le verrou d'écriture est pris dès le début (BEGIN IMMEDIATE) :
+        les vérifications faites dans le bloc ne peuvent pas être invalidées par une autre
+        session. Les lectures des autres connexions ne sont pas bloquées (WAL).
+        Avec invalider_caches=False (écritures hors données métier, ex. table 'jobs'), le
+        compteur de modifications n'est pas incrémenté : les projets ne sont pas rechargés.
+        """
         conn = self.get_connection()
-        cur = conn.cursor()
+        changements = conn.total_changes
+        if immediate and self._local.profondeur == 0 and not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        self._local.profondeur += 1
+        try:
+            yield conn.cursor()
+            if self._local.profondeur == 1:
+                conn.commit()
+                if invalider_caches and conn.total_changes != changements:
+                    with self._verrou_compteur:
+                        self.compteur_modifications += 1
+        except BaseException:
+            if self._local.profondeur == 1:
+                conn.rollback()
+            raise
+        finally:
+            self._local.profondeur -= 1
+
+    def fermer(self):
+        """Ferme la connexion du thread courant et les connexions du pool"""
+        conn = getattr(self._local, 'conn', None)
+        self._local = threading.local()
+        with self._verrou_pool:
+            connexions, self._pool = self._pool, []
+        if conn is not None:
+            connexions.append(conn)
+        for conn in connexions:
+            conn.close()
+
+    def init_database(self):
+        cur = self.get_connection().cursor()
 
         cur.executescript('''
             CREATE TABLE IF NOT EXISTS projets (
@@ -94,15 +194,88 @@ class DatabaseManager:
                 FOREIGN KEY (semaine_id) REFERENCES semaines_production (id),
                 FOREIGN KEY (instance_mur_id) REFERENCES instances_mur (id)
             );
+
+            CREATE TABLE IF NOT EXISTS cache_couts (
+                hauteur INTEGER NOT NULL,
+                largeur INTEGER NOT NULL,
+                isolant TEXT NOT NULL,
+                version TEXT NOT NULL,
+                cout_m2 REAL,
+                cout_mur REAL,
+                PRIMARY KEY (hauteur, largeur, isolant, version)
+            );
+
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                date_application TEXT NOT NULL
+            );
         ''')
-        conn.commit()
-        conn.close()
+        self.appliquer_migrations()
+
+    def version_schema(self):
+        """Retourne la dernière version de schéma appliquée (0 si aucune)"""
+        cur = self.get_connection().cursor()
+        cur.execute("SELECT MAX(version) FROM schema_version")
+        return cur.fetchone()[0] or 0
+
+    @staticmethod
+    def _lister_migrations():
+        """Liste les fichiers de migration 'NNN_description.sql' du dossier bdd/migrations, triés par version"""
+        migrations = []
+        for nom_fichier in os.listdir(DOSSIER_MIGRATIONS):
+            numero, _, reste = nom_fichier.partition('_')
+            if nom_fichier.endswith('.sql') and numero.isdigit():
+                migrations.append((int(numero), reste[:-len('.sql')], os.path.join(DOSSIER_MIGRATIONS, nom_fichier)))
+        return sorted(migrations)
+
+    @staticmethod
+    def _decouper_script(script):
+        """Découpe un script SQL en instructions complètes"""
+        instructions = []
+        courante = ""
+        for ligne in script.splitlines(True):
+            courante += ligne
+            if sqlite3.complete_statement(courante):
+                instructions.append(courante.strip())
+                courante = ""
+        return instructions
+
+    def appliquer_migrations(self):
+        """Applique, chacune dans sa transaction, les migrations plus récentes que la version du schéma
+
+        Returns:
+            list: Versions appliquées
+        """
+        appliquees = []
+        version_actuelle = self.version_schema()
+        for version, description, chemin in self._lister_migrations():
+            if version <= version_actuelle:
+                continue
+            with open(chemin, encoding='utf-8') as f:
+                instructions = self._decouper_script(f.read())
+
+            conn = self.get_connection()
+            cur = conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                for instruction in instructions:
+                    cur.execute(instruction)
+                cur.execute("""
+                    INSERT INTO schema_version (version, description, date_application)
+                    VALUES (?, ?, ?)
+                """, (version, description, datetime.now().isoformat()))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            print(f"Migration {version} appliquée: {description}")
+            appliquees.append(version)
+        return appliquees
 
     # Méthodes pour Document
     def creer_document(self, document, projet_id=None, modele_id=None, instance_id=None):
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        with self.transaction() as cur:
             cur.execute("""
                 INSERT INTO documents 
                 (nom, type, chemin, date_creation, projet_id, modele_mur_id, instance_mur_id)
@@ -110,41 +283,26 @@ class DatabaseManager:
             """, (document.nom, document.type.value, document.chemin, 
                 document.date_creation.isoformat(), projet_id, modele_id, instance_id))
             document.id = cur.lastrowid
-            conn.commit()
-        finally:
-            conn.close()
         return document
 
     def modifier_document(self, document):
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        with self.transaction() as cur:
             cur.execute("""
                 UPDATE documents 
                 SET type = ?, chemin = ?
                 WHERE id = ?
             """, (document.type.value, document.chemin, document.id))
-            conn.commit()
-        finally:
-            conn.close()
 
     def supprimer_document(self, document_id):
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        with self.transaction() as cur:
             cur.execute("DELETE FROM documents WHERE id = ?", (document_id,))
-            conn.commit()
-        finally:
-            conn.close()
 
     # Méthodes pour ModeleMur
     def creer_modele_mur(self, modele, projet_id):
         # Calculer le coût avant la création
-        modele.calculer_cout()
+        modele.calculer_cout(self.cache_couts)
         
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        with self.transaction() as cur:
             cur.execute("""
                 INSERT INTO modeles_mur 
                 (projet_id, reference, longueur, hauteur, epaisseur, cout, statut, isolant)
@@ -160,17 +318,11 @@ class DatabaseManager:
                     VALUES (?, ?, ?, ?, ?, ?)
                 """, (modele.id, ouverture.type, ouverture.largeur, ouverture.hauteur,
                     ouverture.position_x, ouverture.position_y))
-            
-            conn.commit()
-        finally:
-            conn.close()
         return modele
 
     def modifier_modele_mur(self, modele):
-        modele.calculer_cout()
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        modele.calculer_cout(self.cache_couts)
+        with self.transaction() as cur:
             cur.execute("""
                 UPDATE modeles_mur 
                 SET reference = ?, longueur = ?, hauteur = ?, epaisseur = ?, 
@@ -187,182 +339,313 @@ class DatabaseManager:
                     VALUES (?, ?, ?, ?, ?, ?)
                 """, (modele.id, ouverture.type, ouverture.largeur, ouverture.hauteur,
                     ouverture.position_x, ouverture.position_y))
-            
-            conn.commit()
-        finally:
-            conn.close()
+
+    def modifier_couts_modeles_mur(self, modeles):
+        """Enregistre le coût de plusieurs modèles de mur en une seule transaction"""
+        with self.transaction() as cur:
+            cur.executemany("UPDATE modeles_mur SET cout = ? WHERE id = ?",
+                            [(modele.cout, modele.id) for modele in modeles if modele.id])
+
+    def recalculer_couts_modeles_mur(self, projet_id=None):
+        """Recalcule le coût de tous les modèles de mur (ou ceux d'un projet) en une seule transaction
+
+        Returns:
+            int: Nombre de modèles recalculés
+        """
+        with self.transaction() as cur:
+            if projet_id is None:
+                cur.execute("SELECT id, hauteur, longueur, isolant FROM modeles_mur")
+            else:
+                cur.execute("SELECT id, hauteur, longueur, isolant FROM modeles_mur WHERE projet_id = ?", (projet_id,))
+            modeles_data = cur.fetchall()
+
+            couts = self.cache_couts.calculer_batch(
+                [(row['hauteur'], row['longueur'], row['isolant']) for row in modeles_data]
+            )
+            cur.executemany("UPDATE modeles_mur SET cout = ? WHERE id = ?", [
+                (cout_mur if cout_m2 is not None else 0, row['id'])
+                for row, (cout_m2, cout_mur) in zip(modeles_data, couts)
+            ])
+            return len(modeles_data)
+
+    # Méthodes pour le cache des coûts
+    def charger_cache_couts(self, version, cles):
+        """Retourne les coûts en cache pour la version donnée, restreints aux clés (hauteur, largeur, isolant)"""
+        cur = self.get_connection().cursor()
+        cur.execute("""
+            SELECT hauteur, largeur, isolant, cout_m2, cout_mur
+            FROM cache_couts
+            WHERE version = ?
+        """, (version,))
+        cles = set(cles)
+        couts = {}
+        for row in cur.fetchall():
+            cle = (row['hauteur'], row['largeur'], row['isolant'])
+            if cle in cles:
+                couts[cle] = (row['cout_m2'], row['cout_mur'])
+        return couts
+
+    def sauvegarder_cache_couts(self, version, couts):
+        """Enregistre des coûts calculés {(hauteur, largeur, isolant): (cout_m2, cout_mur)} pour la version donnée"""
+        if not couts:
+            return
+        with self.transaction() as cur:
+            cur.executemany("""
+                INSERT OR REPLACE INTO cache_couts
+                (hauteur, largeur, isolant, version, cout_m2, cout_mur)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(h, l, isolant, version, cout_m2, cout_mur)
+                  for (h, l, isolant), (cout_m2, cout_mur) in couts.items()])
+
+    def purger_cache_couts(self, version):
+        """Supprime les coûts en cache calculés avec une autre version du classeur"""
+        with self.transaction() as cur:
+            cur.execute("DELETE FROM cache_couts WHERE version != ?", (version,))
 
     def supprimer_modele_mur(self, modele_id):
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        with self.transaction() as cur:
             cur.execute("DELETE FROM documents WHERE modele_mur_id = ?", (modele_id,))
             cur.execute("DELETE FROM ouvertures WHERE modele_mur_id = ?", (modele_id,))
             cur.execute("DELETE FROM instances_mur WHERE modele_mur_id = ?", (modele_id,))
             cur.execute("DELETE FROM modeles_mur WHERE id = ?", (modele_id,))
-            conn.commit()
-        finally:
-            conn.close()
 
     # Méthodes pour InstanceMur
     def creer_instance_mur(self, instance, projet_id, modele_id):
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        with self.transaction() as cur:
             cur.execute("""
                 INSERT INTO instances_mur 
                 (modele_mur_id, projet_id, numero, statut)
                 VALUES (?, ?, ?, ?)
             """, (modele_id, projet_id, instance.numero, instance.statut.value))
             instance.id = cur.lastrowid
-            conn.commit()
-        finally:
-            conn.close()
         return instance
 
     def modifier_instance_mur(self, instance):
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        with self.transaction() as cur:
             cur.execute("""
                 UPDATE instances_mur 
                 SET statut = ?
                 WHERE id = ?
             """, (instance.statut.value, instance.id))
-            conn.commit()
-        finally:
-            conn.close()
 
     def supprimer_instance_mur(self, instance_id):
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        with self.transaction() as cur:
             cur.execute("DELETE FROM documents WHERE instance_mur_id = ?", (instance_id,))
             cur.execute("DELETE FROM instances_mur WHERE id = ?", (instance_id,))
-            conn.commit()
-        finally:
-            conn.close()
+
+    def creer_instances_mur_bulk(self, modele, projet_id, count, statut=Statut.EN_COURS):
+        """Crée count instances d'un modèle en une transaction, numérotées à la suite des existantes
+
+        Returns:
+            list: Ids des instances créées, dans l'ordre des numéros
+        """
+        if count <= 0:
+            return []
+        # BEGIN IMMEDIATE : aucune autre insertion ne peut s'intercaler entre la lecture
+        # du dernier id et celle des ids créés
+        with self.transaction(immediate=True) as cur:
+            cur.execute("""
+                SELECT COALESCE(MAX(numero), 0), (SELECT COALESCE(MAX(id), 0) FROM instances_mur)
+                FROM instances_mur WHERE modele_mur_id = ?
+            """, (modele.id,))
+            dernier_numero, dernier_id = cur.fetchone()
+            cur.executemany("""
+                INSERT INTO instances_mur (modele_mur_id, projet_id, numero, statut)
+                VALUES (?, ?, ?, ?)
+            """, [(modele.id, projet_id, dernier_numero + i, statut.value) for i in range(1, count + 1)])
+            cur.execute("SELECT id FROM instances_mur WHERE modele_mur_id = ? AND id > ? ORDER BY id",
+                        (modele.id, dernier_id))
+            return [row[0] for row in cur.fetchall()]
+
+    def supprimer_instances_mur_bulk(self, instance_ids):
+        """Supprime des instances, leurs documents et leurs allocations en une transaction
+
+        Returns:
+            int: Nombre d'instances supprimées
+        """
+        parametres = [(instance_id,) for instance_id in instance_ids]
+        if not parametres:
+            return 0
+        with self.transaction() as cur:
+            cur.executemany("DELETE FROM documents WHERE instance_mur_id = ?", parametres)
+            cur.executemany("DELETE FROM allocation_production WHERE instance_mur_id = ?", parametres)
+            cur.executemany("DELETE FROM instances_mur WHERE id = ?", parametres)
+            return cur.rowcount
+
+    def ajuster_nombre_instances_mur(self, modele, projet_id, nb_instances):
+        """Crée ou supprime les dernières instances d'un modèle pour qu'il en ait nb_instances
+
+        Le nombre actuel est relu sous le verrou d'écriture (BEGIN IMMEDIATE) : deux
+        ajustements simultanés ne peuvent pas partir du même nombre périmé.
+
+        Returns:
+            tuple: (ids des instances créées, nombre d'instances supprimées)
+        """
+        with self.transaction(immediate=True) as cur:
+            cur.execute("SELECT id FROM instances_mur WHERE modele_mur_id = ? ORDER BY numero, id", (modele.id,))
+            instance_ids = [row[0] for row in cur.fetchall()]
+            crees = self.creer_instances_mur_bulk(modele, projet_id, nb_instances - len(instance_ids))
+            supprimees = self.supprimer_instances_mur_bulk(instance_ids[nb_instances:])
+        return crees, supprimees
 
     # Méthodes pour Projet
+    def charger_agregats_projets(self, projet_id=None):
+        """Retourne {projet_id: AgregatsProjet} en une requête, sans charger modèles ni instances"""
+        cur = self.get_connection().cursor()
+        if projet_id is None:
+            cur.execute("SELECT * FROM agregats_projets")
+        else:
+            cur.execute("SELECT * FROM agregats_projets WHERE projet_id = ?", (projet_id,))
+        return {
+            row['projet_id']: AgregatsProjet(
+                row['projet_id'], row['cout_total'], row['nb_modeles'], row['nb_instances'],
+                {
+                    Statut.EN_COURS: row['nb_instances_en_cours'],
+                    Statut.VALIDE: row['nb_instances_validees'],
+                    Statut.TERMINE: row['nb_instances_terminees'],
+                },
+                row['nb_murs_alloues'],
+            )
+            for row in cur.fetchall()
+        }
+
     def charger_tous_projets(self):
-        conn = self.get_connection()
-        cur = conn.cursor()
-        
-        cur.execute("SELECT * FROM projets")
+        return self._charger_projets()
+
+    def charger_projet(self, projet_id):
+        projets = self._charger_projets(projet_id)
+        return projets[0] if projets else None
+
+    @staticmethod
+    def _document_depuis_ligne(doc_data):
+        doc = Document(doc_data['nom'], TypeDocument(doc_data['type']), doc_data['chemin'], id=doc_data['id'])
+        doc.date_creation = datetime.fromisoformat(doc_data['date_creation'])
+        return doc
+
+    def _charger_projets(self, projet_id=None):
+        """Charge les projets avec leurs modèles, ouvertures, instances et documents
+
+        Chaque table est lue en une seule requête puis le graphe d'objets est
+        reconstitué en mémoire, quel que soit le nombre de projets.
+        """
+        if projet_id is None:
+            filtre_projet, filtre_modele, filtre_instance, params = "", "", "", ()
+        else:
+            filtre_projet = "WHERE p.id = ?"
+            filtre_modele = "WHERE projet_id = ?"
+            filtre_instance = "WHERE modele_mur_id IN (SELECT id FROM modeles_mur WHERE projet_id = ?)"
+            params = (projet_id,)
+
+        cur = self.get_connection().cursor()
+        # Le coût total est celui tenu à jour par les triggers de la table 'agregats_projets'
+        cur.execute(f"""
+            SELECT p.*, COALESCE(a.cout_total, 0) AS cout_agrege
+            FROM projets p LEFT JOIN agregats_projets a ON a.projet_id = p.id
+            {filtre_projet} ORDER BY p.id
+        """, params)
         projets_data = cur.fetchall()
-        
-        projets = []
+        cur.execute(f"SELECT * FROM modeles_mur {filtre_modele} ORDER BY id", params)
+        modeles_data = cur.fetchall()
+        cur.execute(f"SELECT * FROM ouvertures {filtre_instance} ORDER BY id", params)
+        ouvertures_data = cur.fetchall()
+        cur.execute(f"SELECT * FROM instances_mur {filtre_instance} ORDER BY id", params)
+        instances_data = cur.fetchall()
+        if projet_id is None:
+            cur.execute("SELECT * FROM documents ORDER BY id")
+        else:
+            cur.execute("""
+                SELECT * FROM documents
+                WHERE projet_id = ?
+                   OR modele_mur_id IN (SELECT id FROM modeles_mur WHERE projet_id = ?)
+                   OR instance_mur_id IN (SELECT id FROM instances_mur WHERE projet_id = ?)
+                ORDER BY id
+            """, (projet_id, projet_id, projet_id))
+        documents_data = cur.fetchall()
+
+        projets = {}
         for projet_data in projets_data:
-            projet = self.charger_projet(projet_data['id'])
-            projets.append(projet)
-        
-        conn.close()
-        return projets
+            projet = Projet(projet_data['nom'], projet_data['description'], id=projet_data['id'])
+            projet.cout_total = projet_data['cout_agrege']
+            projet.date_creation = datetime.fromisoformat(projet_data['date_creation'])
+            projet.statut = StatutProjet(projet_data['statut']) if projet_data['statut'] else StatutProjet.EN_CONCEPTION
+            projet.adresse_postale = projet_data['adresse_postale'] if projet_data['adresse_postale'] else ""
+            projet.code_postal = projet_data['code_postal'] if projet_data['code_postal'] else ""
+            projet.ville = projet_data['ville'] if projet_data['ville'] else ""
+            if projet_data['semaine_pose_annee'] and projet_data['semaine_pose_numero']:
+                projet.semaine_pose = (projet_data['semaine_pose_annee'], projet_data['semaine_pose_numero'])
+            projets[projet.id] = projet
 
-    def charger_projet(self, projet_id):
-        conn = self.get_connection()
-        cur = conn.cursor()
-        
-        cur.execute("SELECT * FROM projets WHERE id = ?", (projet_id,))
-        projet_data = cur.fetchone()
-        
-        projet = Projet(projet_data['nom'], projet_data['description'], id=projet_id)
-        projet.cout_total = projet_data['cout_total']
-        projet.date_creation = datetime.fromisoformat(projet_data['date_creation'])
-        projet.statut = StatutProjet(projet_data['statut']) if projet_data['statut'] else StatutProjet.EN_CONCEPTION
-        projet.adresse_postale = projet_data['adresse_postale'] if projet_data['adresse_postale'] else ""
-        projet.code_postal = projet_data['code_postal'] if projet_data['code_postal'] else ""
-        projet.ville = projet_data['ville'] if projet_data['ville'] else ""
-        
-        # Charger documents du projet
-        cur.execute("""
-            SELECT * FROM documents 
-            WHERE projet_id = ? AND modele_mur_id IS NULL AND instance_mur_id IS NULL
-        """, (projet_id,))
-        for doc_data in cur.fetchall():
-            doc = Document(doc_data['nom'], TypeDocument(doc_data['type']), doc_data['chemin'], id=doc_data['id'])
-            doc.date_creation = datetime.fromisoformat(doc_data['date_creation'])
-            projet.documents.append(doc)
-        
-        # Charger modèles de mur
-        cur.execute("SELECT * FROM modeles_mur WHERE projet_id = ?", (projet_id,))
-        for modele_data in cur.fetchall():
-            modele_id = modele_data['id']
+        modeles = {}
+        for modele_data in modeles_data:
+            projet = projets.get(modele_data['projet_id'])
+            if projet is None:
+                continue
             modele = ModeleMur(
                 modele_data['reference'],
                 modele_data['longueur'],
                 modele_data['hauteur'],
                 modele_data['epaisseur'],
                 isolant=TypeIsolant(modele_data['isolant']),
-                id=modele_id
+                id=modele_data['id']
             )
             modele.cout = modele_data['cout']
             modele.statut = Statut(modele_data['statut'])
-            
-            # Charger ouvertures du modèle
-            cur.execute("SELECT * FROM ouvertures WHERE modele_mur_id = ?", (modele_id,))
-            for ouv_data in cur.fetchall():
-                ouverture = Ouverture(
+            modeles[modele.id] = (modele, projet)
+            projet.modeles_mur.append(modele)
+
+        for ouv_data in ouvertures_data:
+            if ouv_data['modele_mur_id'] in modeles:
+                modeles[ouv_data['modele_mur_id']][0].ouvertures.append(Ouverture(
                     ouv_data['type'],
                     ouv_data['largeur'],
                     ouv_data['hauteur'],
                     ouv_data['position_x'],
                     ouv_data['position_y']
-                )
-                modele.ouvertures.append(ouverture)
-            
-            # Charger documents du modèle
-            cur.execute("SELECT * FROM documents WHERE modele_mur_id = ?", (modele_id,))
-            for doc_data in cur.fetchall():
-                doc = Document(doc_data['nom'], TypeDocument(doc_data['type']), doc_data['chemin'], id=doc_data['id'])
-                doc.date_creation = datetime.fromisoformat(doc_data['date_creation'])
-                modele.documents.append(doc)
-            
-            projet.modeles_mur.append(modele)
-            
-            # Charger instances du modèle
-            cur.execute("""
-                SELECT * FROM instances_mur 
-                WHERE modele_mur_id = ? AND projet_id = ?
-            """, (modele_id, projet_id))
-            
-            for inst_data in cur.fetchall():
-                instance = InstanceMur(inst_data['numero'], modele, id=inst_data['id'])
-                instance.statut = Statut(inst_data['statut'])
-                
-                # Charger documents de l'instance
-                cur.execute("SELECT * FROM documents WHERE instance_mur_id = ?", (inst_data['id'],))
-                for doc_data in cur.fetchall():
-                    doc = Document(doc_data['nom'], TypeDocument(doc_data['type']), doc_data['chemin'], id=doc_data['id'])
-                    doc.date_creation = datetime.fromisoformat(doc_data['date_creation'])
-                    instance.documents.append(doc)
-                
-                modele.instances.append(instance)
-                projet.instances_mur.append(instance)
-        
-        conn.close()
-        return projet
+                ))
+
+        instances = {}
+        for inst_data in instances_data:
+            modele, projet = modeles.get(inst_data['modele_mur_id'], (None, None))
+            # Une instance n'est rattachée que si son projet est celui de son modèle
+            if modele is None or inst_data['projet_id'] != projet.id:
+                continue
+            instance = InstanceMur(inst_data['numero'], modele, id=inst_data['id'])
+            instance.statut = Statut(inst_data['statut'])
+            instances[instance.id] = instance
+            modele.instances.append(instance)
+
+        # Les instances du projet sont regroupées par modèle, comme les modèles eux-mêmes
+        for projet in projets.values():
+            for modele in projet.modeles_mur:
+                projet.instances_mur.extend(modele.instances)
+
+        for doc_data in documents_data:
+            if doc_data['modele_mur_id'] is None and doc_data['instance_mur_id'] is None:
+                if doc_data['projet_id'] in projets:
+                    projets[doc_data['projet_id']].documents.append(self._document_depuis_ligne(doc_data))
+                continue
+            if doc_data['modele_mur_id'] in modeles:
+                modeles[doc_data['modele_mur_id']][0].documents.append(self._document_depuis_ligne(doc_data))
+            if doc_data['instance_mur_id'] in instances:
+                instances[doc_data['instance_mur_id']].documents.append(self._document_depuis_ligne(doc_data))
+
+        return list(projets.values())
 
     def creer_projet(self, projet):
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        with self.transaction() as cur:
             cur.execute("""
                 INSERT INTO projets 
-                (nom, description, adresse_postale, code_postal, ville, date_creation, cout_total, statut)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                (nom, description, adresse_postale, code_postal, ville, date_creation, cout_total, statut,
+                 semaine_pose_annee, semaine_pose_numero)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (projet.nom, projet.description, projet.adresse_postale, projet.code_postal, 
-                  projet.ville, projet.date_creation.isoformat(), projet.cout_total, projet.statut.value))
+                  projet.ville, projet.date_creation.isoformat(), projet.cout_total, projet.statut.value,
+                  *(projet.semaine_pose or (None, None))))
             projet.id = cur.lastrowid
-            conn.commit()
-        finally:
-            conn.close()
         return projet
 
     def modifier_projet(self, projet):
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        with self.transaction() as cur:
             cur.execute("""
                 UPDATE projets
                 SET nom = ?,
@@ -372,7 +655,9 @@ class DatabaseManager:
                     adresse_postale = ?,
                     code_postal = ?,
                     ville = ?,
-                    statut = ?
+                    statut = ?,
+                    semaine_pose_annee = ?,
+                    semaine_pose_numero = ?
                 WHERE id = ?
             """, (
                     projet.nom,
@@ -383,16 +668,12 @@ class DatabaseManager:
                     projet.code_postal,
                     projet.ville, 
                     projet.statut.value,
+                    *(projet.semaine_pose or (None, None)),
                     projet.id
                 ))
-            conn.commit()
-        finally:
-            conn.close()
 
     def supprimer_projet(self, projet_id):
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        with self.transaction() as cur:
             # Supprimer tous les documents liés au projet
             cur.execute("DELETE FROM documents WHERE projet_id = ?", (projet_id,))
             # Supprimer toutes les instances de mur
@@ -401,206 +682,451 @@ class DatabaseManager:
             cur.execute("DELETE FROM modeles_mur WHERE projet_id = ?", (projet_id,))
             # Supprimer le projet lui-même
             cur.execute("DELETE FROM projets WHERE id = ?", (projet_id,))
-            conn.commit()
-        finally:
-            conn.close()
 
     # Initialiser semaines production
-    def initialiser_semaines_production(self):
-        """Initialise les semaines de production pour les 6 prochains mois"""
+    def initialiser_semaines_production(self, debut=None, nb_semaines=26):
+        """Crée en une seule requête les semaines ISO manquantes de l'horizon
+
+        Args:
+            debut: Date de la première semaine de l'horizon (semaine courante par défaut)
+            nb_semaines: Nombre de semaines de l'horizon
+        Returns:
+            int: Nombre de semaines créées
+        """
+        if debut is None:
+            debut = date.today()
+        lundi = debut - timedelta(days=debut.weekday())
         conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        avant = conn.total_changes
+        with self.transaction() as cur:
+            # Le jeudi d'une semaine donne son année et son numéro ISO 8601
             cur.execute("""
-                WITH RECURSIVE dates(date) AS (
-                    SELECT date('now', 'start of year')
+                WITH RECURSIVE lundis(lundi, n) AS (
+                    SELECT date(?), 1
                     UNION ALL
-                    SELECT date(date, '+7 days')
-                    FROM dates
-                    WHERE date < date('now', '+6 months')
+                    SELECT date(lundi, '+7 days'), n + 1
+                    FROM lundis
+                    WHERE n < ?
                 )
                 INSERT OR IGNORE INTO semaines_production (annee, numero, est_travaillee)
                 SELECT 
-                    cast(strftime('%Y', date) as integer),
-                    cast(strftime('%W', date) as integer) + 1,
+                    cast(strftime('%Y', date(lundi, '+3 days')) as integer),
+                    (cast(strftime('%j', date(lundi, '+3 days')) as integer) - 1) / 7 + 1,
                     TRUE
-                FROM dates;
-            """)
-            conn.commit()
-        finally:
-            conn.close()
+                FROM lundis;
+            """, (lundi.isoformat(), nb_semaines))
+        # rowcount n'est pas renseigné pour un INSERT précédé d'un WITH
+        return conn.total_changes - avant
+
+    def lire_metadonnee(self, cle):
+        """Retourne la valeur d'une métadonnée, ou None"""
+        cur = self.get_connection().cursor()
+        cur.execute("SELECT valeur FROM metadonnees WHERE cle = ?", (cle,))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+    def ecrire_metadonnee(self, cle, valeur):
+        with self.transaction() as cur:
+            if valeur is None:
+                cur.execute("DELETE FROM metadonnees WHERE cle = ?", (cle,))
+            else:
+                cur.execute("INSERT OR REPLACE INTO metadonnees (cle, valeur) VALUES (?, ?)", (cle, str(valeur)))
+
+    def assurer_horizon_semaines(self, nb_semaines=26, debut=None):
+        """Crée les semaines de l'horizon seulement si elles ne l'ont pas déjà été
+
+        L'intervalle des semaines déjà créées est gardé dans la métadonnée 'horizon_semaines'
+        ('lundi_debut/lundi_fin') : tant que l'horizon demandé y est contenu, aucune écriture.
+
+        Returns:
+            int: Nombre de semaines créées
+        """
+        if debut is None:
+            debut = date.today()
+        lundi = debut - timedelta(days=debut.weekday())
+        fin = lundi + timedelta(weeks=nb_semaines - 1)
+
+        horizon = self.lire_metadonnee('horizon_semaines')
+        if horizon:
+            debut_horizon, fin_horizon = (date.fromisoformat(borne) for borne in horizon.split('/'))
+            if debut_horizon <= lundi and fin <= fin_horizon:
+                return 0
+            # L'intervalle connu est prolongé s'il touche le nouvel horizon
+            if debut_horizon <= lundi <= fin_horizon + timedelta(weeks=1):
+                lundi_stocke, fin = debut_horizon, max(fin, fin_horizon)
+            else:
+                lundi_stocke = lundi
+        else:
+            lundi_stocke = lundi
+
+        with self.transaction():
+            nb_creees = self.initialiser_semaines_production(lundi, nb_semaines)
+            self.ecrire_metadonnee('horizon_semaines', f"{lundi_stocke.isoformat()}/{fin.isoformat()}")
+        print(f"Semaines de production: horizon {lundi_stocke} - {fin}, {nb_creees} semaine(s) créée(s)")
+        return nb_creees
 
     def charger_allocations_instances(self):
-        """Charge toutes les allocations d'instances aux semaines"""
-        conn = self.get_connection()
-        cur = conn.cursor()
+        """Charge toutes les allocations d'instances aux semaines
+
+        Returns:
+            dict: {instance_id: (annee, numero)}
+        """
+        cur = self.get_connection().cursor()
         cur.execute("""
-            SELECT instance_mur_id, numero
+            SELECT instance_mur_id, annee, numero
             FROM allocation_production
             JOIN semaines_production ON semaines_production.id = semaine_id
         """)
-        allocations = {row[0]: row[1] for row in cur.fetchall()}
-        cur.close()
+        allocations = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
         return allocations
 
+    def charger_instances_non_allouees(self, statut):
+        """Charge les instances sans semaine de production des projets d'un statut
+
+        Returns:
+            list: Lignes (instance_id, projet_id, numero) triées par projet puis par numéro
+        """
+        cur = self.get_connection().cursor()
+        cur.execute("""
+            SELECT i.id AS instance_id, i.projet_id, i.numero
+            FROM instances_mur i
+            JOIN projets p ON p.id = i.projet_id
+            LEFT JOIN allocation_production ap ON ap.instance_mur_id = i.id
+            WHERE p.statut = ? AND ap.instance_mur_id IS NULL
+            ORDER BY i.projet_id, i.numero, i.id
+        """, (getattr(statut, 'value', statut),))
+        return cur.fetchall()
+
+    def allouer_instances_bulk(self, allocations):
+        """Alloue plusieurs instances en une transaction
+
+        Args:
+            allocations: Liste de couples (semaine_id, instance_id) ; une instance déjà
+                allouée change de semaine
+        Raises:
+            ConflitAllocation: une semaine cible dépasserait sa capacité ou n'est pas travaillée ;
+                rien n'est écrit
+        """
+        allocations = list(allocations)
+        with self.transaction(immediate=True) as cur:
+            cur.executemany("DELETE FROM allocation_production WHERE instance_mur_id = ?",
+                            [(instance_id,) for _, instance_id in allocations])
+            cur.executemany("""
+                INSERT INTO allocation_production (semaine_id, instance_mur_id)
+                VALUES (?, ?)
+            """, allocations)
+            self._verifier_capacites(cur, {semaine_id for semaine_id, _ in allocations})
+        return len(allocations)
+
+    @staticmethod
+    def _verifier_capacites(cur, semaine_ids):
+        """Lève ConflitAllocation si une des semaines est surchargée ou non travaillée.
+
+        Appelée après les écritures, dans la transaction (BEGIN IMMEDIATE) : le décompte
+        inclut les allocations validées entre-temps par les autres sessions.
+        """
+        semaine_ids = list(semaine_ids)
+        if not semaine_ids:
+            return
+        marques = ",".join("?" * len(semaine_ids))
+        cur.execute(f"""
+            SELECT s.annee, s.numero, s.capacite, s.est_travaillee, COUNT(ap.instance_mur_id) AS charge
+            FROM semaines_production s
+            LEFT JOIN allocation_production ap ON ap.semaine_id = s.id
+            WHERE s.id IN ({marques})
+            GROUP BY s.id
+            HAVING charge > s.capacite OR (NOT s.est_travaillee AND charge > 0)
+        """, semaine_ids)
+        conflits = [(row['annee'], row['numero'], row['charge'], row['capacite'], bool(row['est_travaillee']))
+                    for row in cur.fetchall()]
+        if conflits:
+            raise ConflitAllocation(conflits)
+
+    def retirer_instances_bulk(self, allocations):
+        """Retire plusieurs instances de leurs semaines en une transaction
+
+        Args:
+            allocations: Liste de couples (semaine_id, instance_id)
+        """
+        allocations = list(allocations)
+        with self.transaction() as cur:
+            cur.executemany("""
+                DELETE FROM allocation_production
+                WHERE semaine_id = ? AND instance_mur_id = ?
+            """, allocations)
+        return len(allocations)
+
+    def charger_instances_allouees_projet(self, projet_id):
+        """Charge les instances allouées d'un projet, groupées par semaine
+
+        Returns:
+            dict: {(annee, numero): [InstanceMur]} dans l'ordre chronologique
+        """
+        cur = self.get_connection().cursor()
+        cur.execute("""
+            SELECT s.annee, s.numero AS semaine_numero,
+                   i.id AS instance_id, i.numero, i.statut AS instance_statut,
+                   m.id AS modele_id, m.reference, m.longueur, m.hauteur, m.epaisseur,
+                   m.cout, m.isolant, m.statut AS modele_statut
+            FROM instances_mur i
+            JOIN allocation_production ap ON ap.instance_mur_id = i.id
+            JOIN semaines_production s ON s.id = ap.semaine_id
+            JOIN modeles_mur m ON m.id = i.modele_mur_id
+            WHERE i.projet_id = ?
+            ORDER BY s.annee, s.numero, i.numero
+        """, (projet_id,))
+        modeles = {}
+        instances_par_semaine = {}
+        for row in cur.fetchall():
+            modele = modeles.get(row['modele_id'])
+            if modele is None:
+                modele = ModeleMur(
+                    row['reference'],
+                    row['longueur'],
+                    row['hauteur'],
+                    row['epaisseur'],
+                    TypeIsolant(row['isolant']),
+                    id=row['modele_id']
+                )
+                modele.cout = row['cout']
+                modele.statut = Statut(row['modele_statut'])
+                modeles[modele.id] = modele
+
+            instance = InstanceMur(row['numero'], modele, id=row['instance_id'])
+            instance.statut = Statut(row['instance_statut'])
+            instances_par_semaine.setdefault((row['annee'], row['semaine_numero']), []).append(instance)
+        return instances_par_semaine
+
+    def charger_production_par_projet(self, statut):
+        """Compte les instances allouées par projet et par semaine, pour les projets d'un statut
+
+        Returns:
+            list: Lignes (projet_id, nom, semaine_id, nb_murs) ; la ligne où semaine_id est NULL
+            compte les instances non allouées (0 pour un projet sans instance)
+        """
+        cur = self.get_connection().cursor()
+        cur.execute("""
+            SELECT p.id AS projet_id, p.nom, ap.semaine_id, COUNT(i.id) AS nb_murs
+            FROM projets p
+            LEFT JOIN instances_mur i ON i.projet_id = p.id
+            LEFT JOIN allocation_production ap ON ap.instance_mur_id = i.id
+            WHERE p.statut = ?
+            GROUP BY p.id, ap.semaine_id
+            ORDER BY p.id
+        """, (getattr(statut, 'value', statut),))
+        return cur.fetchall()
+
     def charger_toutes_semaines_production(self):
-        """Charge toutes les semaines de production avec leurs allocations"""
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
-            cur.execute("""
-                SELECT sp.*, ap.instance_mur_id 
-                FROM semaines_production sp
-                LEFT JOIN allocation_production ap ON sp.id = ap.semaine_id
-                ORDER BY sp.annee, sp.numero
-            """)
-            
-            semaines_data = cur.fetchall()
-            semaines = {}  # Utiliser un dictionnaire pour regrouper les instances par semaine
-            
-            for row in semaines_data:
-                semaine_id = row['id']
-                
-                if semaine_id not in semaines:
-                    # Créer la semaine si elle n'existe pas encore
-                    semaine = SemainePlanDeProduction(
-                        numero=row['numero'],
-                        annee=row['annee'],
-                        id=semaine_id
-                    )
-                    semaine.capacite = row['capacite']
-                    semaine.est_travaillee = bool(row['est_travaillee'])
-                    semaines[semaine_id] = semaine
-                
-                # Ajouter l'instance de mur si elle existe
-                if row['instance_mur_id']:
-                    instance = self._charger_instance_mur_specifique(row['instance_mur_id'])
-                    if instance and instance not in semaines[semaine_id].instances_mur:
-                        semaines[semaine_id].instances_mur.append(instance)
-            
-            return list(semaines.values())
-        finally:
-            conn.close()
+        """Charge toutes les semaines de production avec leurs allocations
+
+        Deux requêtes suffisent : les semaines, puis les allocations jointes aux instances
+        et aux modèles. Chaque modèle et chaque instance n'est construit qu'une fois.
+        """
+        cur = self.get_connection().cursor()
+        cur.execute("SELECT * FROM semaines_production ORDER BY annee, numero")
+        semaines = {}
+        for row in cur.fetchall():
+            semaine = SemainePlanDeProduction(
+                numero=row['numero'],
+                annee=row['annee'],
+                id=row['id']
+            )
+            semaine.capacite = row['capacite']
+            semaine.est_travaillee = bool(row['est_travaillee'])
+            semaines[semaine.id] = semaine
+
+        cur.execute("""
+            SELECT ap.semaine_id,
+                   i.id AS instance_id, i.numero, i.statut AS instance_statut,
+                   m.id AS modele_id, m.reference, m.longueur, m.hauteur, m.epaisseur,
+                   m.cout, m.isolant, m.statut AS modele_statut
+            FROM allocation_production ap
+            JOIN instances_mur i ON i.id = ap.instance_mur_id
+            JOIN modeles_mur m ON m.id = i.modele_mur_id
+            ORDER BY ap.semaine_id, i.id
+        """)
+        modeles = {}
+        instances = {}
+        instances_par_semaine = {semaine_id: {} for semaine_id in semaines}
+        for row in cur.fetchall():
+            if row['semaine_id'] not in semaines:
+                continue
+
+            modele = modeles.get(row['modele_id'])
+            if modele is None:
+                modele = ModeleMur(
+                    row['reference'],
+                    row['longueur'],
+                    row['hauteur'],
+                    row['epaisseur'],
+                    TypeIsolant(row['isolant']),
+                    id=row['modele_id']
+                )
+                modele.cout = row['cout']
+                modele.statut = Statut(row['modele_statut'])
+                modeles[modele.id] = modele
+
+            instance = instances.get(row['instance_id'])
+            if instance is None:
+                instance = InstanceMur(row['numero'], modele, id=row['instance_id'])
+                instance.statut = Statut(row['instance_statut'])
+                instances[instance.id] = instance
+
+            instances_par_semaine[row['semaine_id']][instance.id] = instance
+
+        for semaine_id, instances_semaine in instances_par_semaine.items():
+            semaines[semaine_id].instances_mur = list(instances_semaine.values())
+
+        return list(semaines.values())
 
     def sauvegarder_semaine_production(self, semaine):
         """Sauvegarde une nouvelle semaine de production"""
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        with self.transaction() as cur:
             cur.execute("""
                 INSERT INTO semaines_production (annee, numero, capacite, est_travaillee)
                 VALUES (?, ?, ?, ?)
             """, (semaine.annee, semaine.numero, semaine.capacite, semaine.est_travaillee))
             semaine.id = cur.lastrowid
-            conn.commit()
             return semaine
-        finally:
-            conn.close()
 
     def modifier_semaine_production(self, semaine):
         """Met à jour une semaine de production existante"""
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        with self.transaction() as cur:
             cur.execute("""
                 UPDATE semaines_production 
                 SET capacite = ?, est_travaillee = ?
                 WHERE id = ?
             """, (semaine.capacite, semaine.est_travaillee, semaine.id))
-            conn.commit()
             return semaine
-        finally:
-            conn.close()
 
     def supprimer_semaine_production(self, semaine_id):
         """Supprime une semaine de production et ses allocations"""
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+        with self.transaction() as cur:
             # Supprimer d'abord les allocations
             cur.execute("DELETE FROM allocation_production WHERE semaine_id = ?", (semaine_id,))
             # Puis supprimer la semaine
             cur.execute("DELETE FROM semaines_production WHERE id = ?", (semaine_id,))
-            conn.commit()
-        finally:
-            conn.close()
+            # L'horizon n'est plus complet : il sera recréé au prochain accès
+            self.ecrire_metadonnee('horizon_semaines', None)
 
     def allouer_instance_mur(self, semaine_id: int, instance_id: int):
         """Alloue une instance de mur à une semaine dans la base de données"""
-        conn = self.get_connection()
-        cur = conn.cursor()
-
         print(f"Debug - DB: Allocation instance {instance_id} à la semaine {semaine_id}")
         try:
-            # D'abord supprimer toute allocation existante pour cette instance
-            cur.execute("""
-                DELETE FROM allocation_production 
-                WHERE instance_mur_id = ?
-            """, (instance_id,))
-            
-            # Puis insérer la nouvelle allocation
-            cur.execute("""
-                INSERT INTO allocation_production (semaine_id, instance_mur_id) 
-                VALUES (?, ?)
-            """, (semaine_id, instance_id))
-            
-            conn.commit()
+            with self.transaction(immediate=True) as cur:
+                # D'abord supprimer toute allocation existante pour cette instance
+                cur.execute("""
+                    DELETE FROM allocation_production 
+                    WHERE instance_mur_id = ?
+                """, (instance_id,))
+                
+                # Puis insérer la nouvelle allocation
+                cur.execute("""
+                    INSERT INTO allocation_production (semaine_id, instance_mur_id) 
+                    VALUES (?, ?)
+                """, (semaine_id, instance_id))
+                
+                # La capacité est vérifiée sur l'état réel de la base, pas sur celui de la page
+                self._verifier_capacites(cur, [semaine_id])
             print("Debug - DB: Allocation sauvegardée avec succès")
         except Exception as e:
             print(f"Debug - DB: Erreur lors de l'allocation: {str(e)}")
-            conn.rollback()
             raise
-        finally:
-            conn.close()
 
     def retirer_instance_mur(self, semaine_id: int, instance_id: int):
         """Retire une instance de mur d'une semaine dans la base de données"""
-        conn = self.get_connection()
-        cur = conn.cursor()
-
         print(f"Debug - DB: Retrait instance {instance_id} de la semaine {semaine_id}")
         try:
-            cur.execute("""
-                DELETE FROM allocation_production 
-                WHERE semaine_id = ? AND instance_mur_id = ?
-            """, (semaine_id, instance_id))
-            
-            conn.commit()
+            with self.transaction() as cur:
+                cur.execute("""
+                    DELETE FROM allocation_production 
+                    WHERE semaine_id = ? AND instance_mur_id = ?
+                """, (semaine_id, instance_id))
             print("Debug - DB: Retrait effectué avec succès")
         except Exception as e:
             print(f"Debug - DB: Erreur lors du retrait: {str(e)}")
-            conn.rollback()
             raise
-        finally:
-            conn.close()
 
-    def _charger_instance_mur_specifique(self, instance_id):
-        """Charge une instance de mur spécifique avec son modèle"""
-        conn = self.get_connection()
-        cur = conn.cursor()
-        try:
+    # Méthodes pour les tâches de fond (table 'jobs')
+    @staticmethod
+    def _job_depuis_ligne(row):
+        job = Job(row['type'], json.loads(row['parametres']), id=row['id'])
+        job.statut = StatutJob(row['statut'])
+        job.resultat = json.loads(row['resultat']) if row['resultat'] is not None else None
+        job.erreur = row['erreur']
+        job.tentatives = row['tentatives']
+        job.date_creation = datetime.fromisoformat(row['date_creation'])
+        job.date_debut = datetime.fromisoformat(row['date_debut']) if row['date_debut'] else None
+        job.date_fin = datetime.fromisoformat(row['date_fin']) if row['date_fin'] else None
+        return job
+
+    def creer_job(self, job):
+        with self.transaction(invalider_caches=False) as cur:
             cur.execute("""
-                SELECT i.*, m.* FROM instances_mur i
-                JOIN modeles_mur m ON i.modele_mur_id = m.id
-                WHERE i.id = ?
-            """, (instance_id,))
-            data = cur.fetchone()
-            
-            if not data:
-                return None
-                
-            modele = ModeleMur(
-                data['reference'],
-                data['longueur'],
-                data['hauteur'],
-                data['epaisseur'],
-                TypeIsolant(data['isolant']),
-                id=data['modele_mur_id']
-            )
-            
-            instance = InstanceMur(data['numero'], modele, id=instance_id)
-            instance.statut = Statut(data['statut'])
-            
-            return instance
-        finally:
-            conn.close()    
\ No newline at end of file
+                INSERT INTO jobs (type, parametres, statut, tentatives, date_creation)
+                VALUES (?, ?, ?, ?, ?)
+            """, (job.type, json.dumps(job.parametres), job.statut.value, job.tentatives,
+                  job.date_creation.isoformat()))
+            job.id = cur.lastrowid
+        return job
+
+    def charger_job(self, job_id):
+        cur = self.get_connection().cursor()
+        cur.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        row = cur.fetchone()
+        return self._job_depuis_ligne(row) if row else None
+
+    def charger_jobs(self, statuts=None, limite=50):
+        """Retourne les derniers jobs, éventuellement restreints à certains statuts"""
+        cur = self.get_connection().cursor()
+        if statuts:
+            cur.execute(f"""
+                SELECT * FROM jobs WHERE statut IN ({','.join('?' * len(statuts))})
+                ORDER BY id DESC LIMIT ?
+            """, [StatutJob(statut).value for statut in statuts] + [limite])
+        else:
+            cur.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limite,))
+        return [self._job_depuis_ligne(row) for row in cur.fetchall()]
+
+    def demarrer_job(self, job_id):
+        """Passe un job en attente à 'En cours' ; False s'il a déjà été pris par un autre exécuteur"""
+        with self.transaction(invalider_caches=False) as cur:
+            cur.execute("""
+                UPDATE jobs SET statut = ?, tentatives = tentatives + 1, date_debut = ?, date_fin = NULL, erreur = NULL
+                WHERE id = ? AND statut = ?
+            """, (StatutJob.EN_COURS.value, datetime.now().isoformat(), job_id, StatutJob.EN_ATTENTE.value))
+            return cur.rowcount == 1
+
+    def terminer_job(self, job_id, resultat=None):
+        with self.transaction(invalider_caches=False) as cur:
+            cur.execute("""
+                UPDATE jobs SET statut = ?, resultat = ?, date_fin = ? WHERE id = ?
+            """, (StatutJob.TERMINE.value, json.dumps(resultat), datetime.now().isoformat(), job_id))
+
+    def echouer_job(self, job_id, erreur):
+        with self.transaction(invalider_caches=False) as cur:
+            cur.execute("""
+                UPDATE jobs SET statut = ?, erreur = ?, date_fin = ? WHERE id = ?
+            """, (StatutJob.ECHEC.value, str(erreur), datetime.now().isoformat(), job_id))
+
+    def relancer_job(self, job_id):
+        """Remet un job en échec en attente ; False s'il n'était pas en échec"""
+        with self.transaction(invalider_caches=False) as cur:
+            cur.execute("UPDATE jobs SET statut = ? WHERE id = ? AND statut = ?",
+                        (StatutJob.EN_ATTENTE.value, job_id, StatutJob.ECHEC.value))
+            return cur.rowcount == 1
+
+    def reprendre_jobs_interrompus(self):
+        """Remet en attente les jobs restés 'En cours' (processus arrêté) et retourne les ids en attente"""
+        with self.transaction(invalider_caches=False) as cur:
+            cur.execute("UPDATE jobs SET statut = ? WHERE statut = ?",
+                        (StatutJob.EN_ATTENTE.value, StatutJob.EN_COURS.value))
+            cur.execute("SELECT id FROM jobs WHERE statut = ? ORDER BY id", (StatutJob.EN_ATTENTE.value,))
+            return [row['id'] for row in cur.fetchall()]
+
+    def purger_jobs(self, avant):
+        """Supprime les jobs finis avant la date donnée"""
+        with self.transaction(invalider_caches=False) as cur:
+            cur.execute("DELETE FROM jobs WHERE statut IN (?, ?) AND date_fin < ?",
+                        (StatutJob.TERMINE.value, StatutJob.ECHEC.value, avant.isoformat()))
+            return cur.rowcount
@@ -0,0 +1,50 @@
+import threading
+
+class DepotProjets:
+    """Instantané en mémoire de tous les projets, partagé par les sessions Streamlit.
+
+    Les projets ne sont rechargés depuis la base que lorsque le compteur de
+    modifications du DatabaseManager a changé depuis le dernier chargement :
+    un rerun sans écriture ne coûte aucune requête SQL.
+    Avec une session, les projets sont chargés à travers sa carte d'identité : leurs
+    modèles et instances sont les mêmes objets que ceux du plan de production.
+    """
+    def __init__(self, db, session=None):
+        self.db = db
+        self.session = session
+        self._projets = None
+        self._version = None
+        self._agregats = None
+        self._version_agregats = None
+        self._verrou = threading.Lock()
+
+    def projets(self):
+        """Retourne la liste des projets, rechargée si la base a été modifiée"""
+        version = self.db.compteur_modifications
+        if self._projets is None or version != self._version:
+            with self._verrou:
+                # Un autre thread a pu recharger pendant l'attente du verrou
+                version = self.db.compteur_modifications
+                if self._projets is None or version != self._version:
+                    self._projets = (self.session or self.db).charger_tous_projets()
+                    self._version = version
+        return self._projets
+
+    def agregats(self):
+        """Retourne les totaux {projet_id: AgregatsProjet}, relus seulement si la base a été modifiée"""
+        version = self.db.compteur_modifications
+        if self._agregats is None or version != self._version_agregats:
+            with self._verrou:
+                version = self.db.compteur_modifications
+                if self._agregats is None or version != self._version_agregats:
+                    self._agregats = self.db.charger_agregats_projets()
+                    self._version_agregats = version
+        return self._agregats
+
+    def invalider(self):
+        """Force le rechargement au prochain accès (modification faite hors du DatabaseManager)"""
+        with self._verrou:
+            self._projets = None
+            self._agregats = None
+        if self.session is not None:
+            self.session.expirer()
@@ -0,0 +1,20 @@
+-- Table pour les semaines de production
+CREATE TABLE IF NOT EXISTS semaines_production (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    annee INTEGER NOT NULL,
+    numero INTEGER NOT NULL,
+    capacite INTEGER DEFAULT 0,
+    est_travaillee BOOLEAN DEFAULT TRUE,
+    UNIQUE(annee, numero)
+);
+
+-- Table de liaison entre les instances de mur et les semaines de production
+CREATE TABLE IF NOT EXISTS allocation_production (
+    semaine_id INTEGER NOT NULL,
+    instance_mur_id INTEGER NOT NULL,
+    PRIMARY KEY (semaine_id, instance_mur_id),
+    FOREIGN KEY (semaine_id) REFERENCES semaines_production(id),
+    FOREIGN KEY (instance_mur_id) REFERENCES instances_mur(id)
+);
+
+-- Les semaines elles-mêmes sont créées par DatabaseManager.initialiser_semaines_production
@@ -0,0 +1,9 @@
+-- Index sur les clés étrangères utilisées par le chargement des projets et le plan de production
+CREATE INDEX IF NOT EXISTS idx_modeles_mur_projet ON modeles_mur (projet_id);
+CREATE INDEX IF NOT EXISTS idx_ouvertures_modele_mur ON ouvertures (modele_mur_id);
+CREATE INDEX IF NOT EXISTS idx_instances_mur_modele_mur ON instances_mur (modele_mur_id);
+CREATE INDEX IF NOT EXISTS idx_instances_mur_projet ON instances_mur (projet_id);
+CREATE INDEX IF NOT EXISTS idx_documents_projet ON documents (projet_id);
+CREATE INDEX IF NOT EXISTS idx_documents_modele_mur ON documents (modele_mur_id);
+CREATE INDEX IF NOT EXISTS idx_documents_instance_mur ON documents (instance_mur_id);
+CREATE INDEX IF NOT EXISTS idx_allocation_production_instance_mur ON allocation_production (instance_mur_id);
@@ -0,0 +1,5 @@
+-- Valeurs de fonctionnement de l'application (ex. horizon des semaines de production déjà créées)
+CREATE TABLE IF NOT EXISTS metadonnees (
+    cle TEXT PRIMARY KEY,
+    valeur TEXT NOT NULL
+);
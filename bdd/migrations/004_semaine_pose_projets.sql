@@ -0,0 +1,3 @@
+-- Semaine ISO de pose visée pour chaque projet (la fabrication doit être terminée la semaine précédente)
+ALTER TABLE projets ADD COLUMN semaine_pose_annee INTEGER;
+ALTER TABLE projets ADD COLUMN semaine_pose_numero INTEGER;
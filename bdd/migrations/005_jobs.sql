@@ -0,0 +1,15 @@
+-- Tâches de fond soumises par les pages (génération de PDF, création d'instances, calcul des coûts)
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    parametres TEXT NOT NULL,
+    statut TEXT NOT NULL,
+    resultat TEXT,
+    erreur TEXT,
+    tentatives INTEGER NOT NULL DEFAULT 0,
+    date_creation TEXT NOT NULL,
+    date_debut TEXT,
+    date_fin TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_statut ON jobs(statut);
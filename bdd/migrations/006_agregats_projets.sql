@@ -0,0 +1,106 @@
+-- Totaux par projet tenus à jour par des triggers : la liste des projets les lit sans charger
+-- les modèles et les instances. Le coût d'une instance est celui de son modèle.
+CREATE TABLE IF NOT EXISTS agregats_projets (
+    projet_id INTEGER PRIMARY KEY,
+    cout_total REAL NOT NULL DEFAULT 0,
+    nb_modeles INTEGER NOT NULL DEFAULT 0,
+    nb_instances INTEGER NOT NULL DEFAULT 0,
+    nb_instances_en_cours INTEGER NOT NULL DEFAULT 0,
+    nb_instances_validees INTEGER NOT NULL DEFAULT 0,
+    nb_instances_terminees INTEGER NOT NULL DEFAULT 0,
+    nb_murs_alloues INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (projet_id) REFERENCES projets (id)
+);
+
+INSERT OR REPLACE INTO agregats_projets
+    (projet_id, cout_total, nb_modeles, nb_instances, nb_instances_en_cours,
+     nb_instances_validees, nb_instances_terminees, nb_murs_alloues)
+SELECT p.id,
+       COALESCE((SELECT ROUND(SUM(COALESCE(m.cout, 0)), 2)
+                 FROM instances_mur i JOIN modeles_mur m ON m.id = i.modele_mur_id
+                 WHERE i.projet_id = p.id), 0),
+       (SELECT COUNT(*) FROM modeles_mur m WHERE m.projet_id = p.id),
+       (SELECT COUNT(*) FROM instances_mur i WHERE i.projet_id = p.id),
+       (SELECT COUNT(*) FROM instances_mur i WHERE i.projet_id = p.id AND i.statut = 'En cours'),
+       (SELECT COUNT(*) FROM instances_mur i WHERE i.projet_id = p.id AND i.statut = 'Validé'),
+       (SELECT COUNT(*) FROM instances_mur i WHERE i.projet_id = p.id AND i.statut = 'Terminé'),
+       (SELECT COUNT(*) FROM allocation_production a JOIN instances_mur i ON i.id = a.instance_mur_id
+        WHERE i.projet_id = p.id)
+FROM projets p;
+
+CREATE TRIGGER IF NOT EXISTS agregats_projets_creation AFTER INSERT ON projets
+BEGIN
+    INSERT OR IGNORE INTO agregats_projets (projet_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS agregats_projets_suppression AFTER DELETE ON projets
+BEGIN
+    DELETE FROM agregats_projets WHERE projet_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS agregats_modele_creation AFTER INSERT ON modeles_mur
+BEGIN
+    UPDATE agregats_projets SET nb_modeles = nb_modeles + 1 WHERE projet_id = NEW.projet_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS agregats_modele_suppression AFTER DELETE ON modeles_mur
+BEGIN
+    UPDATE agregats_projets SET nb_modeles = nb_modeles - 1 WHERE projet_id = OLD.projet_id;
+END;
+
+-- Un changement de coût du modèle s'applique à toutes ses instances
+CREATE TRIGGER IF NOT EXISTS agregats_modele_cout AFTER UPDATE OF cout ON modeles_mur
+WHEN COALESCE(NEW.cout, 0) != COALESCE(OLD.cout, 0)
+BEGIN
+    UPDATE agregats_projets
+    SET cout_total = ROUND(cout_total + (COALESCE(NEW.cout, 0) - COALESCE(OLD.cout, 0))
+                     * (SELECT COUNT(*) FROM instances_mur WHERE modele_mur_id = NEW.id), 2)
+    WHERE projet_id = NEW.projet_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS agregats_instance_creation AFTER INSERT ON instances_mur
+BEGIN
+    UPDATE agregats_projets
+    SET nb_instances = nb_instances + 1,
+        nb_instances_en_cours = nb_instances_en_cours + (NEW.statut = 'En cours'),
+        nb_instances_validees = nb_instances_validees + (NEW.statut = 'Validé'),
+        nb_instances_terminees = nb_instances_terminees + (NEW.statut = 'Terminé'),
+        cout_total = ROUND(cout_total + COALESCE((SELECT cout FROM modeles_mur WHERE id = NEW.modele_mur_id), 0), 2)
+    WHERE projet_id = NEW.projet_id;
+END;
+
+-- Une allocation restée en base après la suppression de l'instance ne compte plus
+CREATE TRIGGER IF NOT EXISTS agregats_instance_suppression AFTER DELETE ON instances_mur
+BEGIN
+    UPDATE agregats_projets
+    SET nb_instances = nb_instances - 1,
+        nb_instances_en_cours = nb_instances_en_cours - (OLD.statut = 'En cours'),
+        nb_instances_validees = nb_instances_validees - (OLD.statut = 'Validé'),
+        nb_instances_terminees = nb_instances_terminees - (OLD.statut = 'Terminé'),
+        nb_murs_alloues = nb_murs_alloues
+                          - (SELECT COUNT(*) FROM allocation_production WHERE instance_mur_id = OLD.id),
+        cout_total = ROUND(cout_total - COALESCE((SELECT cout FROM modeles_mur WHERE id = OLD.modele_mur_id), 0), 2)
+    WHERE projet_id = OLD.projet_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS agregats_instance_statut AFTER UPDATE OF statut ON instances_mur
+WHEN NEW.statut != OLD.statut
+BEGIN
+    UPDATE agregats_projets
+    SET nb_instances_en_cours = nb_instances_en_cours + (NEW.statut = 'En cours') - (OLD.statut = 'En cours'),
+        nb_instances_validees = nb_instances_validees + (NEW.statut = 'Validé') - (OLD.statut = 'Validé'),
+        nb_instances_terminees = nb_instances_terminees + (NEW.statut = 'Terminé') - (OLD.statut = 'Terminé')
+    WHERE projet_id = NEW.projet_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS agregats_allocation_creation AFTER INSERT ON allocation_production
+BEGIN
+    UPDATE agregats_projets SET nb_murs_alloues = nb_murs_alloues + 1
+    WHERE projet_id = (SELECT projet_id FROM instances_mur WHERE id = NEW.instance_mur_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS agregats_allocation_suppression AFTER DELETE ON allocation_production
+BEGIN
+    UPDATE agregats_projets SET nb_murs_alloues = nb_murs_alloues - 1
+    WHERE projet_id = (SELECT projet_id FROM instances_mur WHERE id = OLD.instance_mur_id);
+END;
@@ -0,0 +1,302 @@
+import threading
+from models import Projet, ModeleMur, InstanceMur, Document, SemainePlanDeProduction
+
+class _Ecritures:
+    """Écritures en attente d'un thread"""
+    def __init__(self):
+        self.operations = []  # [(méthode du DatabaseManager, arguments)] dans l'ordre des appels
+        self.nouveaux = set()  # id() des objets dont la création est en attente
+        self.modifies = set()  # id() des objets dont la mise à jour est en attente
+
+class Session:
+    """Unité de travail entre les objets métier et le DatabaseManager.
+
+    - Carte d'identité : une ligne de la base correspond à un seul objet Python,
+      quel que soit le chargement qui l'a produit (projets du dépôt, semaines du plan
+      de production). Elle est vidée dès que la base a été modifiée : les chargements
+      suivants construisent de nouveaux objets, partagés à leur tour.
+    - Les écritures sont mises en attente puis appliquées en une seule transaction
+      par flush().
+
+    Une session peut être partagée entre threads : la carte d'identité est protégée
+    par un verrou et chaque thread a ses propres écritures en attente.
+
+    La session expose les méthodes d'écriture du DatabaseManager : on peut la passer
+    à la place de `db` aux méthodes sauvegarder/modifier/supprimer des objets métier.
+    Les autres méthodes sont déléguées au DatabaseManager.
+
+    Exemple :
+        with Session(db) as session:
+            for projet in session.charger_tous_projets():
+                projet.modifier(session)
+        # Un seul commit en sortie du bloc (aucun en cas d'exception)
+    """
+    def __init__(self, db):
+        self.db = db
+        self._identites = {}  # (classe, id) -> objet
+        self._complets = set()  # Clés des objets chargés avec toutes leurs collections
+        self._version = None  # Compteur de modifications de la base lors du dernier chargement
+        self._verrou = threading.RLock()
+        self._local = threading.local()
+
+    def __getattr__(self, nom):
+        if nom in ('db', '_local'):
+            raise AttributeError(nom)
+        return getattr(self.db, nom)
+
+    @property
+    def _ecritures(self) -> _Ecritures:
+        ecritures = getattr(self._local, 'ecritures', None)
+        if ecritures is None:
+            ecritures = self._local.ecritures = _Ecritures()
+        return ecritures
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.annuler()
+        return False
+
+    # Carte d'identité
+    def obtenir(self, classe, objet_id):
+        """Retourne l'objet déjà chargé pour cette ligne, ou None"""
+        with self._verrou:
+            return self._identites.get((classe, objet_id))
+
+    def expirer(self):
+        """Oublie les objets chargés : les prochains chargements relisent la base"""
+        with self._verrou:
+            self._identites.clear()
+            self._complets.clear()
+            self._version = None
+
+    def _verifier_version(self):
+        """Vide la carte d'identité si la base a été modifiée depuis le dernier chargement"""
+        version = self.db.compteur_modifications
+        if version != self._version:
+            self._identites.clear()
+            self._complets.clear()
+            self._version = version
+
+    def _enregistrer(self, objet):
+        if objet.id is None:
+            return objet
+        return self._identites.setdefault((type(objet), objet.id), objet)
+
+    def _fusionner_modele(self, modele, complet=True):
+        cle = (ModeleMur, modele.id)
+        existant = self._identites.get(cle)
+        if existant is not None and (cle in self._complets or not complet):
+            return existant
+
+        canonique = existant if existant is not None else modele
+        self._identites[cle] = canonique
+        if complet:
+            # Un modèle déjà connu par le plan de production reçoit ses collections
+            canonique.ouvertures = modele.ouvertures
+            canonique.documents = [self._enregistrer(doc) for doc in modele.documents]
+            canonique.instances = [self._fusionner_instance(inst) for inst in modele.instances]
+            self._complets.add(cle)
+        return canonique
+
+    def _fusionner_instance(self, instance, complet=True):
+        cle = (InstanceMur, instance.id)
+        existant = self._identites.get(cle)
+        if existant is not None and (cle in self._complets or not complet):
+            return existant
+
+        canonique = existant if existant is not None else instance
+        self._identites[cle] = canonique
+        canonique.modele = self._fusionner_modele(instance.modele, complet=False)
+        if complet:
+            canonique.documents = [self._enregistrer(doc) for doc in instance.documents]
+            self._complets.add(cle)
+        return canonique
+
+    def _fusionner_projet(self, projet):
+        existant = self._identites.get((Projet, projet.id))
+        if existant is not None:
+            return existant
+        projet.documents = [self._enregistrer(doc) for doc in projet.documents]
+        projet.modeles_mur = [self._fusionner_modele(modele) for modele in projet.modeles_mur]
+        projet.instances_mur = [self._fusionner_instance(inst) for inst in projet.instances_mur]
+        return self._enregistrer(projet)
+
+    def _fusionner_semaine(self, semaine):
+        existant = self._identites.get((SemainePlanDeProduction, semaine.id))
+        if existant is not None:
+            return existant
+        semaine.instances_mur = [self._fusionner_instance(inst, complet=False) for inst in semaine.instances_mur]
+        return self._enregistrer(semaine)
+
+    # Chargements
+    def charger_tous_projets(self):
+        with self._verrou:
+            self._verifier_version()
+            return [self._fusionner_projet(projet) for projet in self.db.charger_tous_projets()]
+
+    def charger_projet(self, projet_id):
+        with self._verrou:
+            self._verifier_version()
+            projet = self._identites.get((Projet, projet_id))
+            if projet is None:
+                projet = self.db.charger_projet(projet_id)
+                if projet is not None:
+                    projet = self._fusionner_projet(projet)
+            return projet
+
+    def charger_toutes_semaines_production(self):
+        with self._verrou:
+            self._verifier_version()
+            return [self._fusionner_semaine(semaine) for semaine in self.db.charger_toutes_semaines_production()]
+
+    # Écritures différées
+    @property
+    def a_des_modifications(self):
+        return bool(self._ecritures.operations)
+
+    def _planifier(self, methode, *args):
+        self._ecritures.operations.append((methode, args))
+
+    def _planifier_creation(self, methode, objet, *parents):
+        self._ecritures.nouveaux.add(id(objet))
+        self._planifier(methode, objet, *parents)
+        return objet
+
+    def _planifier_modification(self, methode, objet):
+        # L'état de l'objet est lu au flush : une seule mise à jour suffit
+        ecritures = self._ecritures
+        if id(objet) not in ecritures.nouveaux and id(objet) not in ecritures.modifies:
+            ecritures.modifies.add(id(objet))
+            self._planifier(methode, objet)
+        return objet
+
+    def _planifier_suppression(self, methode, classe, objet_id):
+        with self._verrou:
+            objet = self._identites.pop((classe, objet_id), None)
+        if objet is not None:
+            # Inutile de mettre à jour un objet qui va être supprimé
+            ecritures = self._ecritures
+            ecritures.operations = [(m, args) for m, args in ecritures.operations
+                                    if not (m.startswith('modifier_') and args[0] is objet)]
+            ecritures.modifies.discard(id(objet))
+        self._planifier(methode, objet_id)
+
+    def creer_projet(self, projet):
+        return self._planifier_creation('creer_projet', projet)
+
+    def creer_modele_mur(self, modele, projet_id):
+        return self._planifier_creation('creer_modele_mur', modele, projet_id)
+
+    def creer_instance_mur(self, instance, projet_id, modele_id):
+        # Le modèle peut lui-même être en attente de création : son id sera lu au flush
+        return self._planifier_creation('creer_instance_mur', instance, projet_id,
+                                        modele_id if modele_id is not None else instance.modele)
+
+    def creer_document(self, document, projet_id=None, modele_id=None, instance_id=None):
+        return self._planifier_creation('creer_document', document, projet_id, modele_id, instance_id)
+
+    def sauvegarder_semaine_production(self, semaine):
+        return self._planifier_creation('sauvegarder_semaine_production', semaine)
+
+    def modifier_projet(self, projet):
+        return self._planifier_modification('modifier_projet', projet)
+
+    def modifier_modele_mur(self, modele):
+        return self._planifier_modification('modifier_modele_mur', modele)
+
+    def modifier_instance_mur(self, instance):
+        return self._planifier_modification('modifier_instance_mur', instance)
+
+    def modifier_document(self, document):
+        return self._planifier_modification('modifier_document', document)
+
+    def modifier_semaine_production(self, semaine):
+        return self._planifier_modification('modifier_semaine_production', semaine)
+
+    def supprimer_projet(self, projet_id):
+        self._planifier_suppression('supprimer_projet', Projet, projet_id)
+
+    def supprimer_modele_mur(self, modele_id):
+        self._planifier_suppression('supprimer_modele_mur', ModeleMur, modele_id)
+
+    def supprimer_instance_mur(self, instance_id):
+        self._planifier_suppression('supprimer_instance_mur', InstanceMur, instance_id)
+
+    def supprimer_document(self, document_id):
+        self._planifier_suppression('supprimer_document', Document, document_id)
+
+    def supprimer_semaine_production(self, semaine_id):
+        self._planifier_suppression('supprimer_semaine_production', SemainePlanDeProduction, semaine_id)
+
+    def allouer_instance_mur(self, semaine_id, instance_id):
+        self._planifier('allouer_instance_mur', semaine_id, instance_id)
+
+    def retirer_instance_mur(self, semaine_id, instance_id):
+        self._planifier('retirer_instance_mur', semaine_id, instance_id)
+
+    def allouer_instances_bulk(self, allocations):
+        self._planifier('allouer_instances_bulk', list(allocations))
+
+    def retirer_instances_bulk(self, allocations):
+        self._planifier('retirer_instances_bulk', list(allocations))
+
+    def ajouter(self, objet, projet=None, modele=None, instance=None):
+        """Met en attente la création d'un objet ; ses parents peuvent être des objets
+        eux-mêmes en attente de création, leur id est résolu au flush"""
+        if isinstance(objet, Projet):
+            return self.creer_projet(objet)
+        if isinstance(objet, ModeleMur):
+            return self.creer_modele_mur(objet, projet)
+        if isinstance(objet, InstanceMur):
+            return self.creer_instance_mur(objet, projet, modele)
+        if isinstance(objet, Document):
+            return self.creer_document(objet, projet, modele, instance)
+        if isinstance(objet, SemainePlanDeProduction):
+            return self.sauvegarder_semaine_production(objet)
+        raise TypeError(f"Type d'objet non géré par la session: {type(objet).__name__}")
+
+    @staticmethod
+    def _resoudre(valeur):
+        return valeur.id if isinstance(valeur, (Projet, ModeleMur, InstanceMur)) else valeur
+
+    def flush(self):
+        """Applique toutes les écritures en attente du thread dans une seule transaction
+
+        Returns:
+            int: Nombre d'opérations appliquées
+        """
+        ecritures = self._ecritures
+        operations = ecritures.operations
+        if not operations:
+            return 0
+        try:
+            with self.db.transaction():
+                for methode, args in operations:
+                    if methode.startswith(('creer_', 'sauvegarder_')):
+                        objet, parents = args[0], args[1:]
+                        getattr(self.db, methode)(objet, *[self._resoudre(parent) for parent in parents])
+                    else:
+                        getattr(self.db, methode)(*args)
+        except Exception:
+            # Transaction annulée : les objets à créer n'ont pas d'id, les écritures restent en attente
+            for methode, args in operations:
+                if methode.startswith(('creer_', 'sauvegarder_')):
+                    args[0].id = None
+            raise
+
+        self._local.ecritures = _Ecritures()
+        # Les objets créés ont maintenant un id : ils entrent dans la carte d'identité
+        with self._verrou:
+            for methode, args in operations:
+                if methode.startswith(('creer_', 'sauvegarder_')):
+                    self._enregistrer(args[0])
+        return len(operations)
+
+    def annuler(self):
+        """Abandonne les écritures en attente du thread"""
+        self._local.ecritures = _Ecritures()
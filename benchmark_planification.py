@@ -0,0 +1,53 @@
+import argparse
+import os
+import tempfile
+import time
+from typing import List, Optional
+from bdd.benchmark_chargement import remplir_base_synthetique
+from bdd.database import DatabaseManager
+from models import PlanificationProduction, StatutProjet
+
+def main(arguments: Optional[List[str]] = None):
+    """Mesure la planification automatique et vérifie le plan produit (capacités, semaines non travaillées)"""
+    parser = argparse.ArgumentParser(description="Benchmark de PlanificationProduction.planifier_automatiquement")
+    parser.add_argument("--projets", type=int, default=200, help="Projets en fabrication (50 murs chacun)")
+    parser.add_argument("--semaines", type=int, default=52, help="Semaines de l'horizon")
+    parser.add_argument("--capacite", type=int, default=200, help="Capacité de chaque semaine")
+    parser.add_argument("--chomees", type=int, default=3, help="Semaines non travaillées")
+    parser.add_argument("--limite", type=float, default=1.0, help="Durée maximale acceptée (s)")
+    args = parser.parse_args(arguments)
+
+    with tempfile.TemporaryDirectory() as dossier:
+        db = DatabaseManager(os.path.join(dossier, "benchmark_planification.db"))
+        try:
+            remplir_base_synthetique(db, args.projets, modeles_par_projet=5, instances_par_modele=10,
+                                     statut=StatutProjet.EN_FABRICATION)
+            planification = PlanificationProduction(db)
+            semaines = planification.obtenir_semaines(False, maxSemaines=args.semaines)
+            # Semaines non travaillées réparties sur l'horizon
+            chomees = {semaines[(i + 1) * len(semaines) // (args.chomees + 1)].id for i in range(args.chomees)}
+            with db.transaction() as cur:
+                cur.executemany("UPDATE semaines_production SET capacite = ?, est_travaillee = ? WHERE id = ?",
+                                [(args.capacite, s.id not in chomees, s.id) for s in semaines])
+            planification.actualiser()
+
+            debut = time.perf_counter()
+            allocations, non_planifiees = planification.planifier_automatiquement(maxSemaines=args.semaines)
+            duree = time.perf_counter() - debut
+
+            nb_murs = args.projets * 5 * 10
+            print(f"{nb_murs} murs, {len(semaines)} semaines: {len(allocations)} alloués, "
+                  f"{len(non_planifiees)} sans place, {duree * 1000:.0f} ms")
+            assert len(allocations) + len(non_planifiees) == nb_murs
+            for semaine in planification.obtenir_semaines(False, maxSemaines=args.semaines):
+                assert len(semaine.instances_mur) <= semaine.capacite, \
+                    f"Semaine {semaine.numero}/{semaine.annee} au-delà de sa capacité"
+                assert semaine.est_travaillee or not semaine.instances_mur, \
+                    f"Murs alloués à la semaine non travaillée {semaine.numero}/{semaine.annee}"
+            assert duree < args.limite, f"Planification trop lente: {duree:.2f} s"
+        finally:
+            db.fermer()
+    print("Plan valide")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import sys
+from bdd.database import DatabaseManager
+
+def main():
+    """Applique les migrations en attente à la base indiquée (par défaut bdd/construction_projects.db)"""
+    db_file = sys.argv[1] if len(sys.argv) > 1 else "bdd/construction_projects.db"
+    db = DatabaseManager(db_file)  # Les migrations sont appliquées à l'initialisation
+    print(f"Base {db_file} à jour, version du schéma: {db.version_schema()}")
+    db.fermer()
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,8 @@
-from datetime import datetime
+import functools
+import heapq
+import threading
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
 from typing import List, Optional, Dict, Tuple
 from enum import Enum
 from Cout.estimation_cout import process_wall_costs
@@ -24,6 +28,12 @@ class StatutProjet(str, Enum):
     ANNULE = "Abandonné"
     NON_RETENU = "Non retenu"
 
+class StatutJob(str, Enum):
+    EN_ATTENTE = "En attente"
+    EN_COURS = "En cours"
+    TERMINE = "Terminé"
+    ECHEC = "Échec"
+
 class TypeDocument(str, Enum):
     PLAN = "Plan"
     DEVIS = "Devis"
@@ -90,12 +100,15 @@ class ModeleMur:
         self.ouvertures: List[Ouverture] = []
         self.documents: List[Document] = []
         self.instances: List['InstanceMur'] = []
-    def calculer_cout(self):
+    def calculer_cout(self, cache=None):
+        """Calcule le coût du mur, via le cache des coûts s'il est fourni"""
         hauteur_cm = int(self.hauteur)  # Conversion en cm
         largeur_cm = int(self.longueur)  # Conversion en cm
         
-        print("Demarrage calcul cout")
-        cout_m2, cout_mur = process_wall_costs(hauteur_cm, largeur_cm)
+        if cache is not None:
+            cout_m2, cout_mur = cache.calculer(hauteur_cm, largeur_cm, self.isolant)
+        else:
+            cout_m2, cout_mur = process_wall_costs(hauteur_cm, largeur_cm)
         if cout_m2 is not None:
             self.cout = cout_mur
             return cout_mur
@@ -103,6 +116,19 @@ class ModeleMur:
             self.cout = 0  # Valeur par défaut si le calcul n'est pas disponible
             return 0
 
+    def sauvegarder(self, db, projet_id):
+        """Sauvegarde le modèle de mur et ses ouvertures dans la base de données"""
+        return db.creer_modele_mur(self, projet_id)
+
+    def modifier(self, db):
+        """Met à jour le modèle de mur dans la base de données"""
+        return db.modifier_modele_mur(self)
+
+    def supprimer(self, db):
+        """Supprime le modèle de mur, ses ouvertures, instances et documents de la base de données"""
+        if self.id:
+            db.supprimer_modele_mur(self.id)
+
 class InstanceMur:
     def __init__(self, numero: int, modele: ModeleMur, id: int = None):
         self.id = id
@@ -111,6 +137,19 @@ class InstanceMur:
         self.statut = Statut.EN_COURS
         self.documents: List[Document] = []
 
+    def sauvegarder(self, db, projet_id, modele_id):
+        """Sauvegarde l'instance de mur dans la base de données"""
+        return db.creer_instance_mur(self, projet_id, modele_id)
+
+    def modifier(self, db):
+        """Met à jour l'instance de mur dans la base de données"""
+        return db.modifier_instance_mur(self)
+
+    def supprimer(self, db):
+        """Supprime l'instance de mur et ses documents de la base de données"""
+        if self.id:
+            db.supprimer_instance_mur(self.id)
+
 class Projet:
     def __init__(self, nom: str, description: str, id: int = None):
         self.id = id
@@ -123,6 +162,7 @@ class Projet:
         self.cout_total = 0
         self.statut = StatutProjet.EN_CONCEPTION
         self.date_creation = datetime.now()
+        self.semaine_pose: Optional[Tuple[int, int]] = None  # Semaine ISO (annee, numero) de pose visée
         self.modeles_mur: List[ModeleMur] = []
         self.instances_mur: List[InstanceMur] = []
         self.documents: List[Document] = []
@@ -140,6 +180,61 @@ class Projet:
         if self.id:
             db.supprimer_projet(self.id)
 
+    def recalculer_couts(self, db):
+        """Recalcule le coût de tous les modèles de mur du projet et les enregistre en une transaction"""
+        couts = db.cache_couts.calculer_batch(
+            [(modele.hauteur, modele.longueur, modele.isolant) for modele in self.modeles_mur]
+        )
+        for modele, (cout_m2, cout_mur) in zip(self.modeles_mur, couts):
+            modele.cout = cout_mur if cout_m2 is not None else 0
+        db.modifier_couts_modeles_mur(self.modeles_mur)
+
+class AgregatsProjet:
+    """Totaux d'un projet lus dans la table 'agregats_projets', tenue à jour par des triggers"""
+    def __init__(self, projet_id: int, cout_total: float = 0, nb_modeles: int = 0, nb_instances: int = 0,
+                 instances_par_statut: Optional[Dict[Statut, int]] = None, nb_murs_alloues: int = 0):
+        self.projet_id = projet_id
+        self.cout_total = cout_total
+        self.nb_modeles = nb_modeles
+        self.nb_instances = nb_instances
+        self.instances_par_statut: Dict[Statut, int] = instances_par_statut or {statut: 0 for statut in Statut}
+        self.nb_murs_alloues = nb_murs_alloues
+
+    @property
+    def nb_murs_non_alloues(self) -> int:
+        return self.nb_instances - self.nb_murs_alloues
+
+class ConflitAllocation(ValueError):
+    """Allocation refusée par la base : semaine pleine ou non travaillée, en général parce
+    qu'une autre session l'a remplie depuis le dernier chargement du plan"""
+    def __init__(self, semaines: List[Tuple[int, int, int, int, bool]]):
+        # (annee, numero, charge après allocation, capacité, est_travaillee)
+        self.semaines = semaines
+        details = ", ".join(
+            f"semaine {numero} de {annee} ({charge}/{capacite} murs)" if est_travaillee
+            else f"semaine {numero} de {annee} (non travaillée)"
+            for annee, numero, charge, capacite, est_travaillee in semaines
+        )
+        super().__init__(f"Allocation refusée, capacité dépassée : {details}. Le plan a été rechargé.")
+
+class Job:
+    """Tâche de fond enregistrée dans la table 'jobs' ; parametres et resultat sont sérialisés en JSON"""
+    def __init__(self, type_job: str, parametres: Dict[str, object], id: int = None):
+        self.id = id
+        self.type = type_job
+        self.parametres = parametres
+        self.statut = StatutJob.EN_ATTENTE
+        self.resultat = None
+        self.erreur: Optional[str] = None
+        self.tentatives = 0
+        self.date_creation = datetime.now()
+        self.date_debut: Optional[datetime] = None
+        self.date_fin: Optional[datetime] = None
+
+    @property
+    def est_fini(self) -> bool:
+        return self.statut in (StatutJob.TERMINE, StatutJob.ECHEC)
+
 class SemainePlanDeProduction:
     def __init__(self, numero: int, annee: int, id: int = None):
         self.id = id
@@ -180,64 +275,340 @@ class SemainePlanDeProduction:
             self.instances_mur.remove(instance_mur)
             print(f"Debug - Instance retirée de la liste des instances de la semaine")
 
+class MatriceProduction:
+    """Nombre de murs prévus par projet (lignes) et par semaine (colonnes)"""
+    def __init__(self, semaines: List[SemainePlanDeProduction]):
+        self.semaines = semaines
+        self.projet_ids: List[int] = []
+        self.projets: List[str] = []
+        self.valeurs: List[List[int]] = []
+        self.capacites = [s.capacite for s in semaines]
+        self.totaux = [0] * len(semaines)
+        # Par projet : murs sans semaine et murs alloués à une semaine hors de la matrice
+        self.non_allouees: List[int] = []
+        self.hors_horizon: List[int] = []
+        # Par projet, matrice et hors matrice : dernière semaine (annee, numero) allouée
+        # et nombre de semaines ayant des murs alloués
+        self.dernieres_semaines: List[Optional[Tuple[int, int]]] = []
+        self.nb_semaines_allouees: List[int] = []
+
+    def ajouter(self, projet_id: int, nom: str, valeurs: List[int], non_allouees: int = 0, hors_horizon: int = 0,
+                derniere_semaine: Optional[Tuple[int, int]] = None, nb_semaines_allouees: Optional[int] = None):
+        """Ajoute la ligne d'un projet ; sans dernière semaine ni nombre de semaines, seules
+        les colonnes de la matrice sont prises en compte"""
+        actives = [j for j, valeur in enumerate(valeurs) if valeur]
+        if derniere_semaine is None and actives:
+            derniere_semaine = (self.semaines[actives[-1]].annee, self.semaines[actives[-1]].numero)
+        self.projet_ids.append(projet_id)
+        self.projets.append(nom)
+        self.valeurs.append(valeurs)
+        self.non_allouees.append(non_allouees)
+        self.hors_horizon.append(hors_horizon)
+        self.dernieres_semaines.append(derniere_semaine)
+        self.nb_semaines_allouees.append(len(actives) if nb_semaines_allouees is None else nb_semaines_allouees)
+        for j, valeur in enumerate(valeurs):
+            self.totaux[j] += valeur
+
+    def ligne(self, projet_id: int) -> List[int]:
+        """Retourne les murs prévus par semaine pour un projet (zéros s'il est absent)"""
+        if projet_id in self.projet_ids:
+            return self.valeurs[self.projet_ids.index(projet_id)]
+        return [0] * len(self.semaines)
+
+    def premieres_semaines(self, nb_semaines: int, seulementTravaillees=False) -> "MatriceProduction":
+        """Retourne la matrice restreinte aux premières semaines (éventuellement travaillées)"""
+        colonnes = [j for j, semaine in enumerate(self.semaines)
+                    if semaine.est_travaillee or not seulementTravaillees][:nb_semaines]
+        matrice = MatriceProduction([self.semaines[j] for j in colonnes])
+        for k, valeurs in enumerate(self.valeurs):
+            gardees = [valeurs[j] for j in colonnes]
+            matrice.ajouter(self.projet_ids[k], self.projets[k], gardees, self.non_allouees[k],
+                            self.hors_horizon[k] + sum(valeurs) - sum(gardees),
+                            self.dernieres_semaines[k], self.nb_semaines_allouees[k])
+        return matrice
+
+class Replanification:
+    """Résultat d'une simulation de changement de capacité ou de calendrier d'une semaine"""
+    def __init__(self, semaine: SemainePlanDeProduction, capacite: int, est_travaillee: bool):
+        self.semaine = semaine
+        self.capacite = capacite
+        self.est_travaillee = est_travaillee
+        # (id de l'instance, ancienne semaine, nouvelle semaine)
+        self.deplacements: List[Tuple[int, SemainePlanDeProduction, SemainePlanDeProduction]] = []
+        # Instances en surcharge qui ne trouvent pas de place sur l'horizon : elles restent en place
+        self.sans_place: List[int] = []
+
+class EcheanceProjet:
+    """Faisabilité d'un projet en fabrication par rapport à sa semaine de pose visée"""
+    def __init__(self, projet: Projet, murs_restants: int):
+        self.projet_id = projet.id
+        self.nom = projet.nom
+        self.semaine_pose = projet.semaine_pose
+        self.murs_restants = murs_restants
+        self.debut_au_plus_tard: Optional[Tuple[int, int]] = None  # Dernière semaine où commencer
+        self.marge: Optional[int] = None  # Semaines avant le début au plus tard (négatif : irréalisable)
+        self.fin_prevue: Optional[Tuple[int, int]] = None  # Dernière semaine allouée dans le plan actuel
+        self.non_alloues = 0
+        self.a_risque = False
+
+def _sous_verrou(methode):
+    """Exécute une méthode du plan de production en tenant son verrou"""
+    @functools.wraps(methode)
+    def executer(self, *args, **kwargs):
+        with self._verrou:
+            return methode(self, *args, **kwargs)
+    return executer
+
 class PlanificationProduction:
-    """Gestionnaire du plan de production global"""
-    def __init__(self, db):
+    """Gestionnaire du plan de production global.
+
+    Prévu pour vivre longtemps (partagé entre les reruns) : actualiser() ne recharge
+    les semaines que si la base a été modifiée depuis le dernier chargement.
+    Avec une session, les semaines sont chargées à travers sa carte d'identité : leurs
+    instances sont les mêmes objets que celles des projets du dépôt.
+    Partagé entre les sessions Streamlit : les méthodes qui lisent ou modifient les
+    semaines et leurs index tiennent le verrou du plan.
+    """
+    HORIZON_SEMAINES = 26
+
+    def __init__(self, db, session=None):
         self.db = db
+        self.session = session
         self.semaines: Dict[int, SemainePlanDeProduction] = {}
-        self.db.initialiser_semaines_production()  # S'assure que les semaines sont initialisées
+        # Index (annee, numero) -> semaine et id d'instance -> semaine où elle est allouée
+        self._semaines_par_numero: Dict[Tuple[int, int], SemainePlanDeProduction] = {}
+        self._semaine_par_instance: Dict[int, SemainePlanDeProduction] = {}
+        self._version = None
+        self._lundi_horizon = None
+        self._verrou = threading.RLock()
+        self._assurer_horizon()
         self._charger_semaines()
 
+    def _assurer_horizon(self):
+        """Crée les semaines de l'horizon une fois par semaine calendaire au plus"""
+        lundi = date.today() - timedelta(days=date.today().weekday())
+        if lundi != self._lundi_horizon:
+            self.db.assurer_horizon_semaines(self.HORIZON_SEMAINES, lundi)
+            self._lundi_horizon = lundi
+
+    def actualiser(self) -> bool:
+        """Recharge les semaines si la base a été modifiée depuis le dernier chargement"""
+        with self._verrou:
+            self._assurer_horizon()
+            if self.db.compteur_modifications == self._version:
+                return False
+            self._charger_semaines()
+            return True
+
+    @_sous_verrou
     def _charger_semaines(self):
         """Charge toutes les semaines depuis la base de données"""
-        semaines_data = self.db.charger_toutes_semaines_production()
-        self.semaines = {s.id: s for s in semaines_data if s is not None}
+        # Version lue avant le chargement : une écriture concurrente provoquera un rechargement
+        version = self.db.compteur_modifications
+        semaines_data = (self.session or self.db).charger_toutes_semaines_production()
+        # Index construits à part puis remplacés ensemble : jamais d'index à moitié rempli
+        semaines = {}
+        semaines_par_numero = {}
+        semaine_par_instance = {}
+        for semaine in semaines_data:
+            if semaine is not None:
+                semaines[semaine.id] = semaine
+                semaines_par_numero[(semaine.annee, semaine.numero)] = semaine
+                for instance in semaine.instances_mur:
+                    semaine_par_instance[instance.id] = semaine
+        self.semaines, self._semaines_par_numero, self._semaine_par_instance = (
+            semaines, semaines_par_numero, semaine_par_instance)
+        self._version = version
 
+    @_sous_verrou
     def obtenir_semaine(self, annee: int, numero: int) -> Optional[SemainePlanDeProduction]:
         """Retourne une semaine spécifique"""
-        semaine = next(
-            (s for s in self.semaines.values() 
-             if s.annee == annee and s.numero == numero),
-            None
-        )
-        return semaine
+        return self._semaines_par_numero.get((annee, numero))
+
+    @_sous_verrou
+    def obtenir_semaine_instance(self, instance_id: int) -> Optional[SemainePlanDeProduction]:
+        """Retourne la semaine à laquelle une instance de mur est allouée"""
+        return self._semaine_par_instance.get(instance_id)
+
+    @contextmanager
+    def _recharger_si_conflit(self):
+        """En cas de conflit, le plan en mémoire est périmé : il est relu avant de remonter l'erreur"""
+        try:
+            yield
+        except ConflitAllocation:
+            self._charger_semaines()
+            raise
+
+    @_sous_verrou
+    def allouer_instance_mur(self, semaine: SemainePlanDeProduction, instance_mur: InstanceMur):
+        """Alloue une instance à une semaine en tenant les index à jour"""
+        ancienne_semaine = self._semaine_par_instance.get(instance_mur.id)
+        with self._recharger_si_conflit():
+            semaine.allouer_instance_mur(instance_mur, self.db)
+        # La base ne garde qu'une allocation par instance : l'ancienne semaine la perd
+        if ancienne_semaine is not None and ancienne_semaine is not semaine:
+            ancienne_semaine.instances_mur = [
+                i for i in ancienne_semaine.instances_mur if i.id != instance_mur.id
+            ]
+        self._semaine_par_instance[instance_mur.id] = semaine
+
+    @_sous_verrou
+    def retirer_instance_mur(self, semaine: SemainePlanDeProduction, instance_mur: InstanceMur):
+        """Retire une instance d'une semaine en tenant les index à jour"""
+        semaine.retirer_instance_mur(instance_mur, self.db)
+        # Sans session partagée, l'instance en mémoire peut être une autre copie du même mur : comparer les ids
+        semaine.instances_mur = [i for i in semaine.instances_mur if i.id != instance_mur.id]
+        if self._semaine_par_instance.get(instance_mur.id) is semaine:
+            del self._semaine_par_instance[instance_mur.id]
     
+    def _retirer_en_memoire(self, instances: List[InstanceMur]):
+        """Retire des instances des listes de leurs semaines, en une passe par semaine"""
+        ids_par_semaine: Dict[SemainePlanDeProduction, set] = {}
+        for instance in instances:
+            semaine = self._semaine_par_instance.pop(instance.id, None)
+            if semaine is not None:
+                ids_par_semaine.setdefault(semaine, set()).add(instance.id)
+        for semaine, ids in ids_par_semaine.items():
+            semaine.instances_mur = [i for i in semaine.instances_mur if i.id not in ids]
+
+    @_sous_verrou
+    def allouer_instances_mur(self, allocations: List[Tuple[SemainePlanDeProduction, InstanceMur]]):
+        """Alloue plusieurs instances en une seule transaction"""
+        if any(not semaine.est_travaillee for semaine, _ in allocations):
+            raise ValueError("Impossible d'allouer un mur à une semaine non travaillée")
+        with self._recharger_si_conflit():
+            self.db.allouer_instances_bulk([(semaine.id, instance.id) for semaine, instance in allocations])
+        self._retirer_en_memoire([instance for _, instance in allocations])
+        for semaine, instance in allocations:
+            semaine.instances_mur.append(instance)
+            self._semaine_par_instance[instance.id] = semaine
+
+    @_sous_verrou
+    def retirer_instances_mur(self, instances: List[InstanceMur]):
+        """Retire plusieurs instances de leurs semaines en une seule transaction"""
+        self.db.retirer_instances_bulk([
+            (self._semaine_par_instance[instance.id].id, instance.id)
+            for instance in instances if instance.id in self._semaine_par_instance
+        ])
+        self._retirer_en_memoire(instances)
+
+    @_sous_verrou
+    def deplacer_projet(self, projet: Projet, delta_semaines: int) -> int:
+        """
+        Décale les instances d'un projet allouées à partir de la semaine actuelle de
+        delta_semaines semaines travaillées (négatif pour avancer), en une seule transaction.
+        Aucun mur ne peut être placé avant la semaine actuelle.
+
+        Returns:
+            int: Nombre d'instances déplacées
+        """
+        # Les semaines passées restent en base mais ne peuvent plus recevoir de murs
+        actuelle = (self.obtenir_annee_actuelle(), self.obtenir_semaine_actuelle())
+        semaines = sorted((s for s in self.semaines.values() if s.est_travaillee and (s.annee, s.numero) >= actuelle),
+                          key=lambda s: (s.annee, s.numero))
+        positions = {semaine.id: k for k, semaine in enumerate(semaines)}
+
+        allocations = []
+        for instance in projet.instances_mur:
+            semaine = self._semaine_par_instance.get(instance.id)
+            if semaine is None or (semaine.annee, semaine.numero) < actuelle:
+                continue  # Murs non alloués ou déjà passés en production : non déplacés
+            if semaine.id not in positions:
+                raise ValueError(f"Le mur {instance.numero} est alloué à une semaine non travaillée")
+            k = positions[semaine.id] + delta_semaines
+            if not 0 <= k < len(semaines):
+                raise ValueError(f"Le mur {instance.numero} sortirait de l'horizon de planification")
+            allocations.append((semaines[k], instance))
+
+        # Vérifier la capacité des semaines après déplacement
+        variations: Dict[SemainePlanDeProduction, int] = {}
+        for semaine_cible, instance in allocations:
+            semaine_source = self._semaine_par_instance[instance.id]
+            variations[semaine_source] = variations.get(semaine_source, 0) - 1
+            variations[semaine_cible] = variations.get(semaine_cible, 0) + 1
+        for semaine, variation in variations.items():
+            if variation > 0 and len(semaine.instances_mur) + variation > semaine.capacite:
+                raise ValueError(f"Capacité de la semaine {semaine.numero} dépassée")
+
+        if allocations and delta_semaines:
+            self.allouer_instances_mur(allocations)
+        return len(allocations) if delta_semaines else 0
+
     @staticmethod
     def obtenir_semaine_actuelle():
-        """Retourne le numéro de la semaine actuelle"""
+        """Retourne le numéro ISO de la semaine actuelle"""
         return datetime.now().isocalendar()[1]
 
-    def obtenir_semaines(self, seulementTravaillees=False, debutSemaine=None, maxSemaines=26) -> List[SemainePlanDeProduction]:
-        """Retourne les semaines de production"""
+    @staticmethod
+    def obtenir_annee_actuelle():
+        """Retourne l'année ISO de la semaine actuelle (différente de l'année civile fin décembre et début janvier)"""
+        return datetime.now().isocalendar()[0]
+
+    @staticmethod
+    def cles_semaines(debutAnnee: int, debutSemaine: int, nbSemaines: int) -> List[Tuple[int, int]]:
+        """Retourne les clés ISO (annee, numero) de nbSemaines semaines consécutives"""
+        lundi = date.fromisocalendar(debutAnnee, debutSemaine, 1)
+        return [tuple((lundi + timedelta(weeks=k)).isocalendar()[:2]) for k in range(nbSemaines)]
+
+    @_sous_verrou
+    def obtenir_semaines(self, seulementTravaillees=False, debutSemaine=None, maxSemaines=26,
+                         debutAnnee=None) -> List[SemainePlanDeProduction]:
+        """Retourne les semaines de production de l'horizon, en créant celles qui manquent"""
         if debutSemaine is None:
             debutSemaine = self.obtenir_semaine_actuelle()
+        if debutAnnee is None:
+            debutAnnee = self.obtenir_annee_actuelle()
 
-        annee_courante = datetime.now().year
-        
-        # S'assurer que toutes les semaines sont créées de manière continue
-        semaines_necessaires = []
-        for i in range(debutSemaine, debutSemaine + maxSemaines):
-            # Ajuster pour le changement d'année si nécessaire
-            annee = annee_courante
-            numero_semaine = i
-            if numero_semaine > 52:
-                annee = annee_courante + 1
-                numero_semaine = numero_semaine - 52
-
-            # Obtenir la semaine existante ou en créer une nouvelle
-            semaine = self.obtenir_semaine(annee, numero_semaine)
-            if not semaine:
-                # Créer une nouvelle semaine si elle n'existe pas
-                semaine = SemainePlanDeProduction(numero_semaine, annee)
-                semaine = semaine.sauvegarder(self.db)
-                self.semaines[semaine.id] = semaine
-
-            # Ajouter la semaine si elle correspond aux critères
-            if not seulementTravaillees or semaine.est_travaillee:
-                semaines_necessaires.append(semaine)
-
-        return semaines_necessaires
+        cles = self.cles_semaines(debutAnnee, debutSemaine, maxSemaines)
+        if any(cle not in self._semaines_par_numero for cle in cles):
+            # Toutes les semaines manquantes de l'horizon sont créées en une requête
+            self.db.initialiser_semaines_production(date.fromisocalendar(debutAnnee, debutSemaine, 1), maxSemaines)
+            self._charger_semaines()
+
+        semaines = [self._semaines_par_numero[cle] for cle in cles]
+        if seulementTravaillees:
+            semaines = [semaine for semaine in semaines if semaine.est_travaillee]
+        return semaines
 
+    @_sous_verrou
+    def planifier_automatiquement(self, debutSemaine=None, maxSemaines=52,
+                                  debutAnnee=None) -> Tuple[List[Tuple[int, int]], List[int]]:
+        """
+        Alloue les instances non allouées des projets en fabrication aux semaines travaillées,
+        dans la limite de la capacité restante de chaque semaine.
+
+        Les projets sont traités l'un après l'autre et chaque projet reprend là où le
+        précédent s'est arrêté : ses murs occupent des semaines consécutives.
+        Le plan est écrit en une seule transaction.
+
+        Returns:
+            Tuple contenant:
+                - Les allocations créées (semaine_id, instance_id)
+                - Les ids des instances qui n'ont pas trouvé de place sur l'horizon
+        """
+        semaines = self.obtenir_semaines(True, debutSemaine, maxSemaines, debutAnnee)
+        restants = [max(s.capacite - len(s.instances_mur), 0) for s in semaines]
+
+        allocations = []
+        non_planifiees = []
+        j = 0
+        for row in self.db.charger_instances_non_allouees(StatutProjet.EN_FABRICATION):
+            while j < len(semaines) and restants[j] == 0:
+                j += 1
+            if j == len(semaines):
+                non_planifiees.append(row['instance_id'])
+                continue
+            allocations.append((semaines[j].id, row['instance_id']))
+            restants[j] -= 1
+
+        if allocations:
+            with self._recharger_si_conflit():
+                self.db.allouer_instances_bulk(allocations)
+            self._charger_semaines()
+        print(f"Planification automatique: {len(allocations)} murs alloués, {len(non_planifiees)} sans place")
+        return allocations, non_planifiees
+
+    @_sous_verrou
     def definir_capacite_semaine(self, annee: int, numero: int, capacite: int):
         """Définit la capacité de production d'une semaine"""
         print(f"definir_capacite_semaine: {annee} semaine{numero} capacite {capacite}")
@@ -248,6 +619,7 @@ class PlanificationProduction:
         else:
             raise ValueError(f"Semaine {numero} de l'année {annee} non trouvée")
 
+    @_sous_verrou
     def definir_semaine_travaillee(self, annee: int, numero: int, est_travaillee: bool):
         """Définit si une semaine est travaillée ou non"""
         print(f"definir semaine travaillee: {annee} semaine{numero} est_travaillee {est_travaillee}")
@@ -258,6 +630,184 @@ class PlanificationProduction:
         else:
             raise ValueError(f"Semaine {numero} de l'année {annee} non trouvée")
 
+    @_sous_verrou
+    def matrice_production(self, debutSemaine=None, maxSemaines=12, debutAnnee=None,
+                           seulementTravaillees=True) -> MatriceProduction:
+        """
+        Construit la matrice [projet x semaine] des projets en fabrication
+        à partir d'une seule requête groupée par projet et par semaine
+        """
+        semaines = self.obtenir_semaines(seulementTravaillees, debutSemaine, maxSemaines, debutAnnee)
+        colonnes = {semaine.id: j for j, semaine in enumerate(semaines)}
+
+        matrice = MatriceProduction(semaines)
+        # [projet_id, nom, valeurs, non_allouees, hors_horizon, derniere_semaine, nb_semaines_allouees]
+        ligne_courante = None
+        for row in self.db.charger_production_par_projet(StatutProjet.EN_FABRICATION):
+            if ligne_courante is None or ligne_courante[0] != row['projet_id']:
+                if ligne_courante is not None:
+                    matrice.ajouter(*ligne_courante)
+                ligne_courante = [row['projet_id'], row['nom'], [0] * len(semaines), 0, 0, None, 0]
+            if row['semaine_id'] is None:
+                ligne_courante[3] = row['nb_murs']
+                continue
+            j = colonnes.get(row['semaine_id'])
+            if j is not None:
+                ligne_courante[2][j] = row['nb_murs']
+            else:
+                ligne_courante[4] += row['nb_murs']
+            # Les semaines hors de la matrice comptent aussi pour la fin du projet
+            semaine = self.semaines.get(row['semaine_id'])
+            if semaine is not None:
+                cle = (semaine.annee, semaine.numero)
+                ligne_courante[5] = max(ligne_courante[5] or cle, cle)
+                ligne_courante[6] += 1
+        if ligne_courante is not None:
+            matrice.ajouter(*ligne_courante)
+        return matrice
+
+    @_sous_verrou
+    def analyser_echeances(self, projets: List[Projet]) -> List[EcheanceProjet]:
+        """
+        Calcule pour tous les projets en fabrication ayant une semaine de pose le début au plus
+        tard, la marge et le risque de retard, sans requête.
+
+        Ordonnancement au plus tard de tout le portefeuille : les semaines sont parcourues de
+        la dernière échéance vers la semaine actuelle et la capacité de chaque semaine est
+        donnée, via une file de priorité, aux projets dont l'échéance est la plus lointaine.
+        La fabrication doit être terminée la semaine précédant la pose ; une semaine non
+        travaillée ou pas encore créée a une capacité nulle.
+
+        Un projet est à risque si son début au plus tard est dépassé, si le plan actuel le
+        termine après son échéance, ou s'il a des murs non alloués et doit commencer cette semaine.
+        """
+        lundi_actuel = date.fromisocalendar(self.obtenir_annee_actuelle(), self.obtenir_semaine_actuelle(), 1)
+        echeances = []
+        a_planifier = []  # (-indice de la dernière semaine de fabrication, rang du projet)
+        for projet in projets:
+            if projet.statut != StatutProjet.EN_FABRICATION or not projet.semaine_pose:
+                continue
+            restants = [i for i in projet.instances_mur if i.statut != Statut.TERMINE]
+            echeance = EcheanceProjet(projet, len(restants))
+
+            semaines_allouees = [self._semaine_par_instance.get(i.id) for i in restants]
+            echeance.non_alloues = sum(1 for semaine in semaines_allouees if semaine is None)
+            cles_allouees = [(s.annee, s.numero) for s in semaines_allouees if s is not None]
+            echeance.fin_prevue = max(cles_allouees) if cles_allouees else None
+
+            # Indice (à partir de la semaine actuelle) de la semaine précédant la pose
+            lundi_pose = date.fromisocalendar(*projet.semaine_pose, 1)
+            derniere = (lundi_pose - lundi_actuel).days // 7 - 1
+            echeances.append(echeance)
+            if echeance.murs_restants:
+                a_planifier.append((-derniere, len(echeances) - 1))
+
+        if a_planifier:
+            a_planifier.sort()  # Échéance la plus lointaine en premier
+            horizon = max(-a_planifier[0][0] + 1, 0)
+            cles = self.cles_semaines(lundi_actuel.isocalendar()[0], lundi_actuel.isocalendar()[1], horizon)
+            restants = {k: echeances[k].murs_restants for _, k in a_planifier}
+            disponibles = []  # File de priorité des projets fabricables, échéance la plus lointaine en tête
+            prochain = 0
+            for j in range(len(cles) - 1, -1, -1):
+                # Les projets dont l'échéance est atteinte deviennent fabricables
+                while prochain < len(a_planifier) and -a_planifier[prochain][0] >= j:
+                    heapq.heappush(disponibles, a_planifier[prochain])
+                    prochain += 1
+                semaine = self._semaines_par_numero.get(cles[j])
+                capacite = semaine.capacite if semaine is not None and semaine.est_travaillee else 0
+                while capacite and disponibles:
+                    _, k = disponibles[0]
+                    pris = min(capacite, restants[k])
+                    capacite -= pris
+                    restants[k] -= pris
+                    echeances[k].debut_au_plus_tard = cles[j]
+                    echeances[k].marge = j
+                    if restants[k] == 0:
+                        heapq.heappop(disponibles)
+
+            # Murs qui n'ont pas trouvé de place avant la semaine actuelle : irréalisable
+            for k, reste in restants.items():
+                if reste:
+                    echeances[k].debut_au_plus_tard = None
+                    echeances[k].marge = -1
+
+        for echeance in echeances:
+            lundi_pose = date.fromisocalendar(*echeance.semaine_pose, 1)
+            fin_limite = tuple((lundi_pose - timedelta(weeks=1)).isocalendar()[:2])
+            echeance.a_risque = (
+                (echeance.marge is not None and echeance.marge < 0)
+                or (echeance.fin_prevue is not None and echeance.fin_prevue > fin_limite)
+                or (echeance.non_alloues > 0 and echeance.marge == 0)
+            )
+        return sorted(echeances, key=lambda e: (not e.a_risque, e.marge if e.marge is not None else 0))
+
+    @_sous_verrou
+    def simuler_replanification(self, annee: int, numero: int, capacite: int = None,
+                                est_travaillee: bool = None) -> Replanification:
+        """
+        Calcule, sans rien écrire, les déplacements nécessaires si la capacité ou le statut
+        travaillé d'une semaine change.
+
+        Seul l'horizon concerné est parcouru : à partir de la semaine modifiée, les murs
+        en surcharge sont reportés sur les semaines suivantes ayant de la place, et le
+        parcours s'arrête dès que tous les murs reportés ont été placés.
+        """
+        semaine_modifiee = self.obtenir_semaine(annee, numero)
+        if not semaine_modifiee:
+            raise ValueError(f"Semaine {numero} de l'année {annee} non trouvée")
+        replanification = Replanification(
+            semaine_modifiee,
+            semaine_modifiee.capacite if capacite is None else capacite,
+            semaine_modifiee.est_travaillee if est_travaillee is None else est_travaillee
+        )
+
+        cle = (annee, numero)
+        semaines = sorted((s for s in self.semaines.values() if (s.annee, s.numero) >= cle),
+                          key=lambda s: (s.annee, s.numero))
+        a_reporter: List[Tuple[int, SemainePlanDeProduction]] = []
+        for semaine in semaines:
+            if semaine is semaine_modifiee:
+                capacite_semaine = replanification.capacite if replanification.est_travaillee else 0
+            else:
+                capacite_semaine = semaine.capacite if semaine.est_travaillee else 0
+
+            charge = len(semaine.instances_mur)
+            if charge > capacite_semaine:
+                # Les derniers murs de la semaine sont reportés
+                excedent = semaine.instances_mur[capacite_semaine:]
+                a_reporter.extend((instance.id, semaine) for instance in excedent)
+            elif a_reporter:
+                places = capacite_semaine - charge
+                for instance_id, ancienne_semaine in a_reporter[:places]:
+                    replanification.deplacements.append((instance_id, ancienne_semaine, semaine))
+                a_reporter = a_reporter[places:]
+
+            if not a_reporter and semaine is not semaine_modifiee:
+                break
+
+        replanification.sans_place = [instance_id for instance_id, _ in a_reporter]
+        return replanification
+
+    @_sous_verrou
+    def appliquer_replanification(self, replanification: Replanification):
+        """Enregistre le changement de la semaine et les déplacements en une seule transaction"""
+        semaine = self.semaines[replanification.semaine.id]
+        try:
+            with self.db.transaction(immediate=True):
+                semaine.capacite = replanification.capacite
+                semaine.est_travaillee = replanification.est_travaillee
+                semaine.modifier(self.db)
+                if replanification.deplacements:
+                    self.db.allouer_instances_bulk([
+                        (nouvelle_semaine.id, instance_id)
+                        for instance_id, _, nouvelle_semaine in replanification.deplacements
+                    ])
+        finally:
+            # Les semaines en mémoire reflètent ce qui a réellement été écrit
+            self._charger_semaines()
+
+    @_sous_verrou
     def get_production_data(self, projet: Projet) -> Tuple[str, List[int]]:
         """
         Génère les données de production pour un projet spécifique sur 12 semaines
@@ -270,27 +820,14 @@ class PlanificationProduction:
                 - Le nom du projet
                 - Une liste de 12 valeurs représentant le nombre de murs prévus par semaine
         """
-        # Obtenir uniquement les semaines travaillées, triées par date
         semaines_travaillees = self.obtenir_semaines(True, self.obtenir_semaine_actuelle(), 12)
-        
-        # Initialiser le tableau des murs prévus par semaine
+        colonnes = {semaine.id: j for j, semaine in enumerate(semaines_travaillees)}
+
         murs_par_semaine = [0] * 12
-        
-        # Créer un set des IDs des instances du projet pour une recherche plus efficace
-        ids_instances_projet = {instance.id for instance in projet.instances_mur}
-        
-        # Pour chaque semaine, compter les instances de mur du projet
-        for idx, semaine in enumerate(semaines_travaillees):
-            if idx >= 12:  # S'assurer de ne pas dépasser 12 semaines
-                break
-                
-            # Compter uniquement les instances appartenant au projet donné
-            nb_murs = sum(
-                1 for instance in semaine.instances_mur 
-                if instance.id in ids_instances_projet
-            )
-            
-            murs_par_semaine[idx] = nb_murs
+        for instance in projet.instances_mur:
+            semaine = self._semaine_par_instance.get(instance.id)
+            if semaine is not None and semaine.id in colonnes:
+                murs_par_semaine[colonnes[semaine.id]] += 1
             
         return projet.nom, murs_par_semaine
 
@@ -303,87 +840,38 @@ class PlanificationProduction:
                 - Liste des noms de projets
                 - Matrice [projet x semaine] avec le nombre de murs prévus
         """
-        # Filtrer les projets en fabrication
-        projets_en_fabrication = [p for p in self.db.charger_tous_projets() 
-                                if p.statut == StatutProjet.EN_FABRICATION]
-        
-        project_list = []
-        manuf_plan = []
-        
-        # Obtenir les données pour chaque projet
-        for projet in projets_en_fabrication:
-            nom_projet, production_data = self.get_production_data(projet)
-            project_list.append(nom_projet)
-            manuf_plan.append(production_data)  # Utiliser production_data au lieu de get_instances_par_semaine
-        
-        return project_list, manuf_plan
+        matrice = self.matrice_production(self.obtenir_semaine_actuelle(), 12)
+        # Toujours 12 colonnes, même si certaines semaines ne sont pas travaillées
+        return matrice.projets, [valeurs + [0] * (12 - len(valeurs)) for valeurs in matrice.valeurs]
     
-    def get_instances_par_semaine(self, projet_nom: str) -> Dict[int, List[InstanceMur]]:
+    def instances_par_semaine(self, projet_id: int) -> Dict[Tuple[int, int], List[InstanceMur]]:
         """
-        Retourne un dictionnaire des instances de mur par semaine pour un projet donné
+        Retourne les instances allouées d'un projet groupées par semaine (annee, numero),
+        en une seule requête
         """
-        instances_par_semaine = {}
-        
-        # Récupérer tous les projets
-        projets = self.db.charger_tous_projets()
-        
-        projet = next((p for p in projets if p.nom == projet_nom), None)
-        
-        if not projet:
-            print("Debug - Projet non trouvé")
-            return {}
-            
-        # Pour chaque semaine travaillée
-        semaines = self.obtenir_semaines(True)
-        
-        for semaine in semaines:
-            
-            # Filtrer les instances qui appartiennent au projet
-            instances = []
-            for instance in semaine.instances_mur:
-                projet_instance = next(
-                    (p for p in projets if any(
-                        inst.id == instance.id for inst in p.instances_mur
-                    )),
-                    None
-                )
-                if projet_instance and projet_instance.id == projet.id:
-                    instances.append(instance)
-
-            if instances:
-                instances_par_semaine[semaine.numero] = instances
-                
-        return instances_par_semaine
+        return self.db.charger_instances_allouees_projet(projet_id)
 
-    def reaffecter_instance(self, instance_id: int, nouvelle_semaine: int):
+    @_sous_verrou
+    def reaffecter_instance(self, instance_id: int, nouvelle_semaine: int, annee: int = None):
         """
         Déplace une instance de mur vers une nouvelle semaine
         
         Args:
             instance_id: ID de l'instance à déplacer
             nouvelle_semaine: Numéro de la nouvelle semaine
+            annee: Année ISO de la nouvelle semaine (année courante par défaut)
         """
         # Trouver la semaine actuelle
+        ancienne_semaine = self._semaine_par_instance.get(instance_id)
         instance = None
-        ancienne_semaine = None
-        
-        for semaine in self.semaines.values():
-            for inst in semaine.instances_mur:
-                if inst.id == instance_id:
-                    instance = inst
-                    ancienne_semaine = semaine
-                    break
-            if instance:
-                break
+        if ancienne_semaine:
+            instance = next((i for i in ancienne_semaine.instances_mur if i.id == instance_id), None)
         
         if not instance:
             raise ValueError("Instance non trouvée")
             
         # Trouver la nouvelle semaine
-        semaine_cible = next(
-            (s for s in self.semaines.values() if s.numero == nouvelle_semaine),
-            None
-        )
+        semaine_cible = self.obtenir_semaine(annee or self.obtenir_annee_actuelle(), nouvelle_semaine)
         
         if not semaine_cible:
             raise ValueError("Semaine cible non trouvée")
@@ -392,6 +880,6 @@ class PlanificationProduction:
         if len(semaine_cible.instances_mur) >= semaine_cible.capacite:
             raise ValueError("Capacité de la semaine cible dépassée")
         
-        # Effectuer le déplacement
-        ancienne_semaine.retirer_instance_mur(instance, self.db)
-        semaine_cible.allouer_instance_mur(instance, self.db)
\ No newline at end of file
+        # Effectuer le déplacement : l'allocation remplace l'ancienne dans la même transaction,
+        # le mur garde sa semaine en cas de conflit
+        self.allouer_instance_mur(semaine_cible, instance)
\ No newline at end of file